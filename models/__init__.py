@@ -1,4 +1,10 @@
-from .svm import svm_srl
+# svm_srl is resolved on first access so that numpy only modules
+# e.g models.linear_scorer can be imported without loading liblinear
+def __getattr__(name):
+    if name == 'svm_srl':
+        from .svm import svm_srl
+        return svm_srl
+    raise AttributeError('module {:} has no attribute {:}'.format(__name__, name))
 # from .feature_factory import process
 # from .svm import to_svm, SVM
-# from .evaluator import Evaluator
\ No newline at end of file
+# from .evaluator import Evaluator
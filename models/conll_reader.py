@@ -0,0 +1,72 @@
+'''
+    @author: Varela
+
+    Streaming conll reader
+    * Reads a file line by line and yields one proposition block at a time
+    * Interns tokens into lexicon ids while reading, blocks come out as int32 arrays
+    * Memory is bounded by the largest block, not by the file
+'''
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+
+class ConllReader(object):
+    '''
+        Streams conll files whose tokens have one tab separated value per column,
+        any other line (e.g blank) separates proposition blocks
+
+        Usage:
+            reader = ConllReader(('ID', 'FORM', 'LEMMA'))
+            for skipped, codes in reader.blocks('datasets_1.1/conll/Teste.conll'):
+                ...
+            reader.lexicons['FORM']
+    '''
+    def __init__(self, columns, lexicons=None):
+        '''
+            args:
+                columns     .: tuple<str> conll columns in file order
+
+                lexicons    .: dict<str, dict<str, int>> shared lexicons extended
+                                while reading, a new one when None
+        '''
+        self.columns = tuple(columns)
+        self.lexicons = defaultdict(dict) if lexicons is None else lexicons
+
+    def blocks(self, path):
+        '''
+            Proposition blocks of a conll file
+
+            args:
+                path        .: str conll file
+
+            yields:
+                skipped     .: int separator lines read before the block
+
+                codes       .: np.ndarray<int32> tokens x columns lexicon ids
+                                the last block is empty when the file ends
+                                with separators
+        '''
+        ncolumns = len(self.columns)
+        lexicons = [self.lexicons[column] for column in self.columns]
+        codes = array('i')
+        skipped = 0
+        with open(path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                values = line.rstrip('\n').split('\t')
+                if len(values) == ncolumns:
+                    for lexicon, value in zip(lexicons, values):
+                        value = value.strip()
+                        codes.append(lexicon.setdefault(value, len(lexicon)))
+                else:
+                    if codes:
+                        yield skipped, _block(codes, ncolumns)
+                        codes = array('i')
+                        skipped = 0
+                    skipped += 1
+        yield skipped, _block(codes, ncolumns)
+
+
+def _block(codes, ncolumns):
+    return np.frombuffer(codes, dtype=np.int32).reshape(-1, ncolumns)
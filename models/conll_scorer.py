@@ -0,0 +1,773 @@
+'''
+    @author: Varela
+
+    In-process port of the CoNLL 2005 shared task scorer srl-eval.pl
+    * Gold propositions are parsed once per dataset into a GoldIndex of int
+      arrays cached on disk and memory mapped
+    * Predictions are scored from memory, no props file or perl process
+    * Counts, warnings and report text match srlconll-1.1/bin/srl-eval.pl
+
+    ref:
+        SOFTWARE: http://www.lsi.upc.edu/~srlconll/soft.html
+'''
+import json
+import re
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from models.feature_cache import CACHE_DIR, HEADER, file_digest, publish, staging_dir
+
+# roles left out of the overall figures
+EXCLUDED = ('V',)
+# Bump when GoldIndex's layout changes
+GOLD_INDEX_VERSION = 1
+
+_OPEN = re.compile(r'\(((?:\\\*|[^*(])+)')
+_CLOSE = re.compile(r'([^)]*)\)')
+# '*', '(A*', '*)' or '(A*)' where A is not a continuation
+_SIMPLE = re.compile(r'^(?:\((?!C-)([^*()\\]+))?\*(\))?$')
+
+_ALIGN = 'sentence {:} : gold and pred sentences do not align correctly!'
+_WITHOUT_GOLD = 'sentence {:} : verb {:} at position {:} : found predicted prop without its gold reference! Skipping prop!'
+_MISSING = 'sentence {:} : verb {:} at position {:} : missing predicted prop! Counting all arguments as missed!'
+_MISMATCH = 'sentence {:} : props do not match : expecting {:} at position {:}, found {:} at position {:}! Counting all gold arguments as missed!'
+_NO_COLUMN = "sentence {:} : can't find column of args for prop {:}!"
+
+
+class ConllScorer(object):
+    '''
+        Scores predicted propositions against a gold props file
+
+        Usage:
+            scorer = ConllScorer('datasets_1.1/props/wValidacao.golden.props')
+            counts = scorer.score(sentences)   # [(targets, [tags, ...]), ...]
+            counts = scorer.score_arrays(bounds, targets, labels, vocab)
+            print(report(counts))
+    '''
+    def __init__(self, gold_path, cache_dir=CACHE_DIR):
+        '''
+            args:
+                gold_path   .: str path to a gold props file
+
+                cache_dir   .: str where the GoldIndex is cached
+        '''
+        self.gold_path = gold_path
+        self.index = GoldIndex.load(gold_path, cache_dir)
+        self._gold = None
+
+    @property
+    def gold(self):
+        '''
+            Gold propositions as objects, only needed by the exact path
+        '''
+        if self._gold is None:
+            self._gold = self.index.sentences()
+        return self._gold
+
+    def score(self, sentences):
+        '''
+            Compares predicted sentences with the gold ones sentence by sentence
+
+            args:
+                sentences   .: iterable<tuple<list<str>, list<list<str>>>>
+                                targets column (predicates or '-') and one column of
+                                start-end tags per predicate, see read_sentences
+
+            returns:
+                counts      .: dict<str, ?>
+                                sentences, propositions, perfect: int
+                                overall: dict<str, int> ok (corr.), op (excess), ms (missed)
+                                roles: dict<str, dict<str, int>> same for each role
+                                excluded: dict<str, dict<str, int>> same for V
+                                warnings: list<str> srl-eval.pl's warnings
+
+            raises:
+                ValueError  .: when gold and predicted sentences do not align
+        '''
+        counts = _counts()
+        warnings = counts['warnings']
+        gold_warnings = self.index.warnings_by_sentence()
+        sentences = iter(sentences)
+        for ns, (length, gold) in enumerate(self.gold):
+            warnings.extend(gold_warnings.get(ns, []))
+            try:
+                targets, columns = next(sentences)
+            except StopIteration:
+                targets, columns = [], []
+            if len(targets) != length:
+                raise ValueError(_ALIGN.format(ns))
+            _, pred = _props(targets, columns, ns, warnings)
+
+            npos = max(gold) + 1 if gold else 0
+            for position in range(npos):
+                gprop = gold.get(position, None)
+                pprop = pred.get(position, None)
+                if pprop is not None and gprop is None:
+                    warnings.append(_WITHOUT_GOLD.format(ns, pprop[0], position))
+                    continue
+                if gprop is None:
+                    continue
+                if pprop is None:
+                    warnings.append(_MISSING.format(ns, gprop[0], position))
+                    pprop = (gprop[0], [])
+                elif gprop[0] != pprop[0]:
+                    warnings.append(_MISMATCH.format(ns, gprop[0], position, pprop[0], position))
+                    pprop = (gprop[0], [])
+
+                counts['propositions'] += 1
+                if _evaluate(gprop[1], pprop[1], counts):
+                    counts['perfect'] += 1
+            counts['sentences'] += 1
+        return _finish(counts)
+
+    def score_file(self, pred_path):
+        '''
+            Scores a predicted props file, same as
+            perl srl-eval.pl <gold_path> <pred_path>
+        '''
+        with open(pred_path, mode='r', encoding='utf-8') as f:
+            return self.score(read_sentences(f))
+
+    def score_arrays(self, bounds, targets, labels, vocab):
+        '''
+            Scores predictions held in arrays, each sentence has a single
+            column of tags which belongs to its first predicate (as a props file
+            written one proposition per sentence). Argument spans are matched
+            against the GoldIndex with array operations, propositions having
+            discontinuous, continuation or malformed arguments go through the
+            exact path of score.
+
+            args:
+                bounds      .: np.ndarray<int> sentence offsets into the tokens
+                                sentence i spans bounds[i]:bounds[i + 1]
+
+                targets     .: sequence<str> predicate or '-' for every token
+
+                labels      .: np.ndarray<int> tag id for every token
+
+                vocab       .: sequence<str> tag of every tag id e.g '(A0*', '*)'
+
+            returns:
+                counts      .: dict<str, ?> as score
+
+            raises:
+                ValueError  .: when gold and predicted sentences do not align
+        '''
+        index = self.index
+        counts = _counts()
+        nsent = len(index.length)
+        bounds = np.asarray(bounds, dtype=np.int64)
+
+        # sentence alignment
+        lengths = np.zeros(nsent, dtype=np.int64)
+        npred = min(nsent, len(bounds) - 1)
+        lengths[:npred] = np.diff(bounds[:npred + 1])
+        misaligned = np.flatnonzero(lengths != index.length)
+        if len(misaligned):
+            raise ValueError(_ALIGN.format(misaligned[0]))
+        ntok = int(index.length.sum())
+        first = int(bounds[0]) if len(bounds) else 0
+        targets = np.asarray(targets, dtype=object)[first:first + ntok]
+        labels = np.asarray(labels, dtype=np.int64)[first:first + ntok]
+        sentence = np.repeat(np.arange(nsent), index.length)
+        offset = np.concatenate(([0], np.cumsum(index.length)))
+        position = np.arange(ntok) - offset[sentence]
+        maxlen = int(index.length.max()) + 1 if nsent else 1
+        # (sentence, position) and (sentence, start, end) keys
+        key = lambda s, p: s * maxlen + p
+        span = lambda s, a, b: (s * maxlen + a) * maxlen + b
+
+        # predicted propositions, the column goes to the first one of a sentence
+        ptok = np.flatnonzero(targets != '-')
+        psent = sentence[ptok]
+        ppos = position[ptok]
+        pfirst = np.ones(len(ptok), dtype=bool)
+        pfirst[1:] = psent[1:] != psent[:-1]
+
+        # gold propositions
+        gsent = np.asarray(index.prop_sentence, dtype=np.int64)
+        gpos = np.asarray(index.prop_position, dtype=np.int64)
+        gverb = np.array(index.verbs, dtype=object)[np.asarray(index.prop_verb)] \
+            if len(gsent) else np.zeros(0, dtype=object)
+        npos = np.zeros(nsent, dtype=np.int64)
+        np.maximum.at(npos, gsent, gpos + 1)
+
+        gkey = key(gsent, gpos)
+        pkey = key(psent, ppos)
+        loc = np.minimum(np.searchsorted(gkey, pkey), max(len(gkey) - 1, 0))
+        pfound = (gkey[loc] == pkey) if len(gkey) else np.zeros(len(pkey), dtype=bool)
+        gpred = np.full(len(gsent), -1, dtype=np.int64)
+        gpred[loc[pfound]] = np.flatnonzero(pfound)
+        has_pred = gpred >= 0
+        same_verb = np.zeros(len(gsent), dtype=bool)
+        same_verb[has_pred] = gverb[has_pred] == targets[ptok[gpred[has_pred]]]
+
+        # warnings keyed by (sentence, stage, position)
+        warnings = []
+        for ns, message in index.warnings:
+            warnings.append((ns, 0, -1, message))
+        for i in np.flatnonzero(~pfirst):
+            warnings.append((psent[i], 1, ppos[i], _NO_COLUMN.format(psent[i], targets[ptok[i]])))
+        for i in np.flatnonzero(~pfound & (ppos < npos[psent])):
+            warnings.append((psent[i], 2, ppos[i], _WITHOUT_GOLD.format(psent[i], targets[ptok[i]], ppos[i])))
+        for g in np.flatnonzero(~has_pred):
+            warnings.append((gsent[g], 2, gpos[g], _MISSING.format(gsent[g], gverb[g], gpos[g])))
+        for g in np.flatnonzero(has_pred & ~same_verb):
+            p = targets[ptok[gpred[g]]]
+            warnings.append((gsent[g], 2, gpos[g], _MISMATCH.format(gsent[g], gverb[g], gpos[g], p, gpos[g])))
+        counts['warnings'] = [w[3] for w in sorted(warnings, key=lambda w: w[:3])]
+
+        # tags of the sentences holding a column: simple ones are '*', '(A*', '*)'
+        # and '(A*)' nesting at most one level deep, the others are parsed
+        roles = list(index.roles)
+        opens, closes, tag_type, simple = _tag_table(vocab, roles)
+        col_sent = np.zeros(nsent, dtype=bool)
+        col_sent[psent[pfirst]] = True
+        tok_open = opens[labels]
+        tok_close = closes[labels]
+        depth = np.cumsum(tok_open - tok_close)
+        before = depth - tok_open + tok_close
+        base = before[offset[:-1]] if ntok else np.zeros(0, dtype=np.int64)
+        before = before - base[sentence]
+        valid = simple[labels] & ((tok_open == 0) | (before == 0)) & \
+            ((tok_close == 0) | (before + tok_open == 1))
+        ends = offset[1:] - 1
+        sent_ok = np.bincount(sentence[~valid], minlength=nsent) == 0
+        sent_ok &= (depth[ends] - base) == 0 if ntok else sent_ok
+        parsed = {}
+        for ns in np.flatnonzero(col_sent & ~sent_ok):
+            tags = [vocab[t] for t in labels[offset[ns]:offset[ns + 1]]]
+            parsed[ns] = _arguments(tags)
+
+        # propositions whose arguments are compared
+        scored = has_pred & same_verb & pfirst[np.maximum(gpred, 0)]
+        gcomplex = index.complex_props()
+        fast = scored & ~gcomplex & sent_ok[gsent]
+        fast_sent = np.zeros(nsent, dtype=bool)
+        fast_sent[gsent[fast]] = True
+
+        # predicted spans of fast sentences
+        span_tok = fast_sent[sentence]
+        o = np.flatnonzero(span_tok & (tok_open == 1))
+        c = np.flatnonzero(span_tok & (tok_close == 1))
+        asent = sentence[o]
+        atype = tag_type[labels[o]]
+        akey = span(asent, position[o], position[c])
+
+        # gold spans of fast propositions
+        prop_args = np.asarray(index.prop_args, dtype=np.int64)
+        nargs = np.diff(prop_args)
+        garg_prop = np.repeat(np.arange(len(gsent)), nargs)
+        gmask = fast[garg_prop]
+        garg = np.flatnonzero(gmask)
+        gsent_arg = gsent[garg_prop[garg]]
+        gtype = np.asarray(index.arg_type, dtype=np.int64)[garg]
+        gkey_arg = span(gsent_arg, np.asarray(index.arg_start, dtype=np.int64)[garg],
+                        np.asarray(index.arg_end, dtype=np.int64)[garg])
+        order = np.argsort(gkey_arg, kind='stable')
+        gkey_arg, gtype, gsent_arg = gkey_arg[order], gtype[order], gsent_arg[order]
+
+        loc = np.minimum(np.searchsorted(gkey_arg, akey), max(len(gkey_arg) - 1, 0))
+        ok = np.zeros(len(akey), dtype=bool)
+        if len(gkey_arg):
+            ok = (gkey_arg[loc] == akey) & (gtype[loc] == atype)
+        gmatched = np.zeros(len(gkey_arg), dtype=bool)
+        gmatched[loc[ok]] = True
+
+        # missed: gold arguments of fast propositions left unmatched and every
+        # argument of propositions without a usable prediction
+        empty = ~scored
+        emask = empty[garg_prop]
+        ms_types = np.concatenate((gtype[~gmatched],
+                                   np.asarray(index.arg_type, dtype=np.int64)[emask]))
+        nroles = len(roles)
+        tally = {
+            'ok': np.bincount(atype[ok], minlength=nroles),
+            'op': np.bincount(atype[~ok], minlength=nroles),
+            'ms': np.bincount(ms_types, minlength=nroles),
+        }
+        excluded = np.array([role in EXCLUDED for role in roles], dtype=bool)
+        for name, values in tally.items():
+            for t in np.flatnonzero(values):
+                role = roles[t]
+                target = counts['excluded'] if excluded[t] else counts['roles']
+                target[role][name] += int(values[t])
+                if not excluded[t]:
+                    counts['overall'][name] += int(values[t])
+
+        # perfect propositions: no excess nor missed arguments outside of V
+        bad = np.zeros(nsent, dtype=np.int64)
+        np.add.at(bad, asent[~ok & ~excluded[atype]], 1)
+        np.add.at(bad, gsent_arg[~gmatched & ~excluded[gtype]], 1)
+        counts['perfect'] += int(np.count_nonzero(fast & (bad[gsent] == 0)))
+        gexcluded = excluded[np.asarray(index.arg_type, dtype=np.int64)] \
+            if nargs.sum() else np.zeros(0, dtype=bool)
+        missed = np.bincount(garg_prop[emask & ~gexcluded], minlength=len(gsent))
+        counts['perfect'] += int(np.count_nonzero(empty & (missed == 0)))
+
+        # exact path for the remaining scored propositions
+        gold = None
+        for g in np.flatnonzero(scored & ~fast):
+            if gold is None:
+                gold = self.gold
+            ns = gsent[g]
+            if ns in parsed:
+                pred = parsed[ns]
+            else:
+                pred = _spans_to_args(position, tok_open, tok_close, tag_type, labels,
+                                      roles, offset[ns], offset[ns + 1])
+            if _evaluate(gold[ns][1][gpos[g]][1], pred, counts):
+                counts['perfect'] += 1
+
+        counts['propositions'] = len(gsent)
+        counts['sentences'] = nsent
+        return _finish(counts)
+
+
+class GoldIndex(object):
+    '''
+        Gold propositions of a props file as int arrays
+
+        propositions: prop_sentence, prop_position, prop_verb (id into verbs)
+                      and prop_args offsets, proposition i owns arguments
+                      prop_args[i]:prop_args[i + 1]
+        arguments:    arg_start, arg_end, arg_type (id into roles) and
+                      arg_pieces offsets into piece_start, piece_end for
+                      discontinuous arguments
+        Arguments sharing a span are kept once, the last one as srl-eval.pl does
+
+        Usage:
+            index = GoldIndex.load('datasets_1.1/props/wValidacao.golden.props')
+    '''
+    ARRAYS = ('length', 'prop_sentence', 'prop_position', 'prop_verb', 'prop_args',
+              'arg_start', 'arg_end', 'arg_type', 'arg_pieces', 'piece_start', 'piece_end')
+
+    def __init__(self, arrays, verbs, roles, warnings):
+        '''
+            args:
+                arrays      .: dict<str, np.ndarray<int32>> keys in ARRAYS
+
+                verbs       .: list<str> predicates
+
+                roles       .: list<str> argument types
+
+                warnings    .: list<tuple<int, str>> sentence and warning
+                                raised while reading the gold file
+        '''
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.verbs = verbs
+        self.roles = roles
+        self.warnings = warnings
+
+    @classmethod
+    def parse(cls, gold_path):
+        '''
+            Reads a gold props file into arrays
+        '''
+        arrays = {name: [] for name in cls.ARRAYS}
+        arrays['prop_args'].append(0)
+        arrays['arg_pieces'].append(0)
+        verbs, roles, warnings = OrderedDict(), OrderedDict(), []
+        with open(gold_path, mode='r', encoding='utf-8') as f:
+            for ns, (targets, columns) in enumerate(read_sentences(f)):
+                sentence_warnings = []
+                length, props = _props(targets, columns, ns, sentence_warnings)
+                warnings.extend([ns, w] for w in sentence_warnings)
+                arrays['length'].append(length)
+                for position, (verb, args) in props.items():
+                    arrays['prop_sentence'].append(ns)
+                    arrays['prop_position'].append(position)
+                    arrays['prop_verb'].append(verbs.setdefault(verb, len(verbs)))
+                    spans = OrderedDict()
+                    for a in args:
+                        spans[(a.start, a.end)] = a
+                    for a in spans.values():
+                        arrays['arg_start'].append(a.start)
+                        arrays['arg_end'].append(a.end)
+                        arrays['arg_type'].append(roles.setdefault(a.type, len(roles)))
+                        for p in a.phrases:
+                            arrays['piece_start'].append(p.start)
+                            arrays['piece_end'].append(p.end)
+                        arrays['arg_pieces'].append(len(arrays['piece_start']))
+                    arrays['prop_args'].append(len(arrays['arg_start']))
+        arrays = {name: np.array(values, dtype=np.int32) for name, values in arrays.items()}
+        return cls(arrays, list(verbs), list(roles), warnings)
+
+    @classmethod
+    def load(cls, gold_path, cache_dir=CACHE_DIR):
+        '''
+            Memory maps the cached index of gold_path, parses and caches it
+            when the file's contents are new
+
+            args:
+                gold_path   .: str path to a gold props file
+
+                cache_dir   .: str cache root, the index goes to
+                                cache_dir/gold_props/<digest>/
+        '''
+        target_dir = '{:}gold_props/{:}/'.format(cache_dir, file_digest(gold_path)[:16])
+        header_path = target_dir + HEADER
+        try:
+            with open(header_path, mode='r', encoding='utf-8') as f:
+                header = json.load(f)
+            if header['version'] == GOLD_INDEX_VERSION:
+                arrays = {name: np.load('{:}{:}.npy'.format(target_dir, name), mmap_mode='r')
+                          for name in cls.ARRAYS}
+                return cls(arrays, header['verbs'], header['roles'], header['warnings'])
+        except IOError:
+            # not cached yet or replaced by another process while reading
+            pass
+
+        index = cls.parse(gold_path)
+        index.store(target_dir)
+        return index
+
+    def store(self, target_dir):
+        '''
+            Writes the arrays and header to a staging directory renamed to
+            target_dir, processes scoring the same gold file never read a
+            partial index
+        '''
+        staging = staging_dir(target_dir)
+        for name in self.ARRAYS:
+            np.save('{:}{:}.npy'.format(staging, name), getattr(self, name))
+        header = {'version': GOLD_INDEX_VERSION, 'verbs': self.verbs,
+                  'roles': self.roles, 'warnings': self.warnings}
+        with open(staging + HEADER, mode='w', encoding='utf-8') as f:
+            json.dump(header, f, ensure_ascii=False)
+        publish(staging, target_dir)
+
+    def complex_props(self):
+        '''
+            Propositions having discontinuous arguments
+        '''
+        multi = np.diff(np.asarray(self.arg_pieces, dtype=np.int64)) > 0
+        per_prop = np.concatenate(([0], np.cumsum(multi)))[np.asarray(self.prop_args)]
+        return np.diff(per_prop) > 0
+
+    def warnings_by_sentence(self):
+        warnings = defaultdict(list)
+        for ns, message in self.warnings:
+            warnings[ns].append(message)
+        return warnings
+
+    def sentences(self):
+        '''
+            Propositions as objects, the input of _evaluate
+
+            returns:
+                sentences   .: list<tuple<int, dict<int, tuple<str, list<_Phrase>>>>>
+                                length and propositions keyed by position
+        '''
+        sentences = [(int(length), OrderedDict()) for length in self.length]
+        for i in range(len(self.prop_sentence)):
+            args = []
+            for j in range(self.prop_args[i], self.prop_args[i + 1]):
+                a = _Phrase(int(self.arg_start[j]), int(self.arg_end[j]), self.roles[self.arg_type[j]])
+                for k in range(self.arg_pieces[j], self.arg_pieces[j + 1]):
+                    a.phrases.append(_Phrase(int(self.piece_start[k]), int(self.piece_end[k]), None))
+                args.append(a)
+            props = sentences[self.prop_sentence[i]][1]
+            props[int(self.prop_position[i])] = (self.verbs[self.prop_verb[i]], args)
+        return sentences
+
+
+def read_sentences(lines):
+    '''
+        Splits props lines into sentences, a sentence ends on a blank line
+        and an empty sentence ends the file (as srl-eval.pl)
+
+        args:
+            lines       .: iterable<str>
+
+        returns:
+            sentences   .: generator<tuple<list<str>, list<list<str>>>>
+                            targets column and the remaining columns
+    '''
+    cols = []
+    for line in lines:
+        tokens = line.split()
+        if tokens:
+            for i, token in enumerate(tokens):
+                if i == len(cols):
+                    cols.append([])
+                cols[i].append(token)
+        elif cols:
+            yield cols[0], cols[1:]
+            cols = []
+        else:
+            return
+    if cols:
+        yield cols[0], cols[1:]
+
+
+def precrecf1(ok, op, ms):
+    '''
+        Precision, recall and F1 in percentage points
+    '''
+    p = 100.0 * ok / (ok + op) if ok + op > 0 else 0.0
+    r = 100.0 * ok / (ok + ms) if ok + ms > 0 else 0.0
+    f1 = 2 * p * r / (p + r) if p + r > 0 else 0.0
+    return p, r, f1
+
+
+def report(counts):
+    '''
+        srl-eval.pl's text output for counts
+
+        args:
+            counts      .: dict<str, ?> from ConllScorer.score
+
+        returns:
+            txt         .: str
+    '''
+    row = '{:>10}   {:6d}  {:6d}  {:6d}   {:6.2f}  {:6.2f}  {:6.2f}\n'
+    ruler = '------------------------------------------------------------\n'
+    ntargets = counts['propositions']
+    overall = counts['overall']
+
+    txt = 'Number of Sentences    :      {:6d}\n'.format(counts['sentences'])
+    txt += 'Number of Propositions :      {:6d}\n'.format(ntargets)
+    txt += 'Percentage of perfect props : {:6.2f}\n'.format(
+        100.0 * counts['perfect'] / ntargets if ntargets > 0 else 0)
+    txt += '\n'
+    txt += '{:>10}   {:>6}  {:>6}  {:>6}   {:>6}  {:>6}  {:>6}\n'.format(
+        '', 'corr.', 'excess', 'missed', 'prec.', 'rec.', 'F1')
+    txt += ruler
+    txt += row.format('Overall', overall['ok'], overall['op'], overall['ms'],
+                      *precrecf1(overall['ok'], overall['op'], overall['ms']))
+    txt += '----------\n'
+    for role in sorted(counts['roles']):
+        c = counts['roles'][role]
+        txt += row.format(role, c['ok'], c['op'], c['ms'], *precrecf1(c['ok'], c['op'], c['ms']))
+    txt += ruler
+    for role in sorted(counts['excluded']):
+        c = counts['excluded'][role]
+        txt += row.format(role, c['ok'], c['op'], c['ms'], *precrecf1(c['ok'], c['op'], c['ms']))
+    txt += ruler
+    return txt
+
+
+class _Phrase(object):
+    '''
+        Span of words start..end (inclusive) with a role, arguments with
+        sub phrases are discontinuous (SRL::phrase / SRL::arg)
+    '''
+    __slots__ = ('start', 'end', 'type', 'phrases')
+
+    def __init__(self, start, end, type_):
+        self.start = start
+        self.end = end
+        self.type = type_
+        self.phrases = []
+
+
+def _zeros():
+    return {'ok': 0, 'op': 0, 'ms': 0}
+
+
+def _counts():
+    return {
+        'sentences': 0,
+        'propositions': 0,
+        'perfect': 0,
+        'overall': _zeros(),
+        'roles': defaultdict(_zeros),
+        'excluded': defaultdict(_zeros),
+        'warnings': [],
+    }
+
+
+def _finish(counts):
+    counts['roles'] = dict(counts['roles'])
+    counts['excluded'] = dict(counts['excluded'])
+    return counts
+
+
+def _tag_table(vocab, roles):
+    '''
+        Per tag id: opens (0/1), closes (0/1), type id of the opened
+        argument and whether it is simple, unknown types are added to roles
+    '''
+    codes = {role: i for i, role in enumerate(roles)}
+    n = len(vocab)
+    opens = np.zeros(n, dtype=np.int64)
+    closes = np.zeros(n, dtype=np.int64)
+    tag_type = np.zeros(n, dtype=np.int64)
+    simple = np.zeros(n, dtype=bool)
+    for i, tag in enumerate(vocab):
+        match = _SIMPLE.match(tag) if tag is not None else None
+        if match is None:
+            continue
+        simple[i] = True
+        if match.group(1) is not None:
+            opens[i] = 1
+            if match.group(1) not in codes:
+                codes[match.group(1)] = len(roles)
+                roles.append(match.group(1))
+            tag_type[i] = codes[match.group(1)]
+        if match.group(2) is not None:
+            closes[i] = 1
+    return opens, closes, tag_type, simple
+
+
+def _spans_to_args(position, tok_open, tok_close, tag_type, labels, roles, lb, ub):
+    '''
+        Arguments of a sentence made of simple tags
+    '''
+    o = np.flatnonzero(tok_open[lb:ub]) + lb
+    c = np.flatnonzero(tok_close[lb:ub]) + lb
+    return [_Phrase(int(position[i]), int(position[j]), roles[tag_type[labels[i]]])
+            for i, j in zip(o, c)]
+
+
+def _props(targets, columns, ns, warnings):
+    '''
+        Propositions of a sentence keyed by the position of their verb
+        (SRL::sentence::load_props)
+
+        returns:
+            length      .: int number of words
+
+            props       .: dict<int, tuple<str, list<_Phrase>>> verb and arguments
+    '''
+    props = OrderedDict()
+    columns = iter(columns)
+    for position, verb in enumerate(targets):
+        if verb == '-':
+            continue
+        tags = next(columns, None)
+        if tags is None:
+            warnings.append(_NO_COLUMN.format(ns, verb))
+            props[position] = (verb, [])
+        else:
+            props[position] = (verb, _arguments(tags))
+    return len(targets), props
+
+
+def _arguments(tags):
+    '''
+        Arguments in a column of start-end tags, continuation phrases C-A
+        are merged into the last A argument (SRL::prop::load_SE_tagging)
+    '''
+    args = []
+    last = {}
+    for a in _phrases(tags):
+        if a.type.startswith('C-'):
+            type_ = a.type[2:]
+            if type_ in last:
+                pc, a = a, last[type_]
+                if not a.phrases:
+                    a.phrases.append(_Phrase(a.start, a.end, type_))
+                a.phrases.append(pc)
+                a.end = pc.end
+            else:
+                a.type = type_
+                args.append(a)
+                last[type_] = a
+        else:
+            args.append(a)
+            last[a.type] = a
+    return args
+
+
+def _phrases(tags):
+    '''
+        Phrases in a column of start-end tags including embedded ones,
+        ordered by start then longest first (SRL::phrase_set::load_SE_tagging)
+    '''
+    spans = {}
+    stack = []
+    for wid, tag in enumerate(tags):
+        while not tag.startswith('*'):
+            match = _OPEN.match(tag)
+            if match is None:
+                raise ValueError('opening nodes -- bad format in {:} at {:}-th position!'.format(tag, wid))
+            stack.append(_Phrase(wid, None, match.group(1)))
+            tag = tag[match.end():]
+        tag = tag[1:]
+        while tag:
+            match = _CLOSE.match(tag)
+            if match is None or not stack:
+                raise ValueError('closing phrases -- bad format in {:}!'.format(tag))
+            type_ = match.group(1)
+            tag = tag[match.end():]
+            p = stack.pop()
+            if type_ and type_ != p.type:
+                raise ValueError('types do not match!')
+            p.end = wid
+            if stack:
+                stack[-1].phrases.append(p)
+            else:
+                for q in _dfs(p):
+                    spans[(q.start, q.end)] = q
+    if stack:
+        raise ValueError('some phrases are unclosed!')
+    return [spans[k] for k in sorted(spans, key=lambda k: (k[0], -k[1]))]
+
+
+def _dfs(p):
+    yield p
+    for q in p.phrases:
+        for r in _dfs(q):
+            yield r
+
+
+def _evaluate(gold, pred, counts):
+    '''
+        Accumulates corr. excess and missed arguments of a proposition
+        (srl-eval.pl evaluate_proposition / SRL::prop::discriminate_args)
+
+        returns:
+            perfect     .: bool no excess nor missed arguments
+    '''
+    index = OrderedDict()
+    for a in gold:
+        index[(a.start, a.end)] = a
+
+    ok, op = [], []
+    for a in pred:
+        key = (a.start, a.end)
+        g = index.get(key, None)
+        if g is None:
+            op.append(a)
+        elif not g.phrases and not a.phrases:
+            if g.type == a.type:
+                ok.append(a)
+                del index[key]
+            else:
+                op.append(a)
+        elif not g.phrases or not a.phrases:
+            op.append(a)
+        else:
+            match = g.type == a.type
+            pieces = set((p.start, p.end) for p in g.phrases) if match else set()
+            for p in a.phrases:
+                if not match:
+                    break
+                if (p.start, p.end) in pieces:
+                    pieces.remove((p.start, p.end))
+                else:
+                    match = False
+            if match and not pieces:
+                ok.append(a)
+                del index[key]
+            else:
+                op.append(a)
+    ms = list(index.values())
+
+    nop = nms = 0
+    for key, args in (('ok', ok), ('op', op), ('ms', ms)):
+        for a in args:
+            if a.type in EXCLUDED:
+                counts['excluded'][a.type][key] += 1
+            else:
+                counts['overall'][key] += 1
+                counts['roles'][a.type][key] += 1
+                if key == 'op':
+                    nop += 1
+                elif key == 'ms':
+                    nms += 1
+    return nop == 0 and nms == 0
@@ -0,0 +1,188 @@
+'''
+    @author: Varela
+
+    Dependency tree engine over parent pointer arrays
+    * Every token points to its head (-1 for roots)
+    * Depth, chain top and binary lifting tables are computed by pointer jumping
+    * Paths between tokens pass through the lowest common ancestor (LCA)
+'''
+import numpy as np
+
+# Index of an absent node
+NONE = -1
+
+
+def parents(ids, heads, lb, ub):
+    '''
+        Converts conll ID and DTREE columns into parent pointers
+
+        args:
+            ids         .: np.ndarray<int> ID column, position within the span starting at 1
+
+            heads       .: np.ndarray<int> DTREE column, ID of the head 0 for root
+
+            lb          .: np.ndarray<int> first token of each token's span
+
+            ub          .: np.ndarray<int> one past the last token of each token's span
+
+        returns:
+            parent      .: np.ndarray<int> index of the head, NONE for roots
+                            and heads falling outside of the span
+    '''
+    index = np.arange(len(ids))
+    parent = index + (heads - ids)
+    outside = (heads == 0) | (parent < lb) | (parent >= ub)
+    return np.where(outside, NONE, parent)
+
+
+def span_roots(heads, lb, ub):
+    '''
+        Root of each token's span: the last token with DTREE=0
+
+        args:
+            heads       .: np.ndarray<int> DTREE column
+
+            lb          .: np.ndarray<int> first token of each token's span
+
+            ub          .: np.ndarray<int> one past the last token of each token's span
+
+        returns:
+            root        .: np.ndarray<int> NONE if the span has no root
+    '''
+    is_root = heads == 0
+    # rightmost root at or before position, restricted to the span
+    last = np.where(is_root, np.arange(len(heads)), NONE)
+    last = np.maximum.accumulate(last)
+    root = last[ub - 1]
+    return np.where(root >= lb, root, NONE)
+
+
+class DepTree(object):
+    '''
+        Dependency forest over parent pointers
+
+        Usage:
+            tree = DepTree(parent)
+            tree.ancestor(nodes, 2)     # grand parents
+            tree.children(3)            # first 3 children
+            tree.paths(tokens, targets) # nodes from tokens to targets
+    '''
+    def __init__(self, parent):
+        '''
+            args:
+                parent      .: np.ndarray<int> head of every node NONE for roots
+        '''
+        self.parent = np.asarray(parent, dtype=np.int64)
+        index = np.arange(len(self.parent))
+        self_loop = self.parent == index
+
+        # pointer jumping: after k steps up[k] is the 2^k-th ancestor
+        # saturated at the top of the chain, depth accumulates the hops
+        nxt = np.where(self.parent < 0, index, self.parent)
+        depth = (self.parent >= 0).astype(np.int64)
+        self.up = [nxt]
+        for _ in range(max(len(index), 1).bit_length() + 1):
+            if np.array_equal(nxt[nxt], nxt):
+                break
+            depth = depth + depth[nxt]
+            nxt = nxt[nxt]
+            self.up.append(nxt)
+
+        # chains that never reach a root are cycles
+        self.cyclic = (nxt[nxt] != nxt) | self_loop[nxt]
+        self.top = np.where(self.cyclic, NONE, nxt)
+        self.depth = depth
+
+    def ancestor(self, nodes, steps):
+        '''
+            Ancestor of nodes steps hops up the tree
+
+            args:
+                nodes       .: np.ndarray<int>
+
+                steps       .: int or np.ndarray<int>
+
+            returns:
+                ancestors   .: np.ndarray<int> NONE when steps exceed depth
+        '''
+        nodes = np.asarray(nodes, dtype=np.int64)
+        steps = np.broadcast_to(steps, nodes.shape)
+        valid = (nodes >= 0) & (steps >= 0) & \
+            (steps <= np.where(nodes >= 0, self.depth[nodes], -1))
+        result = np.where(valid, nodes, 0)
+        for k, up in enumerate(self.up):
+            jump = valid & ((steps >> k) & 1).astype(bool)
+            result = np.where(jump, up[result], result)
+        return np.where(valid, result, NONE)
+
+    def children(self, k):
+        '''
+            First k children of every node in index order
+
+            returns:
+                children    .: np.ndarray<int> nodes x k, NONE padded
+        '''
+        n = len(self.parent)
+        result = np.full((n, k), NONE, dtype=np.int64)
+        child = np.flatnonzero((self.parent >= 0) & ~(self.parent == np.arange(n)))
+        owner = self.parent[child]
+        order = np.argsort(owner, kind='stable')
+        child, owner = child[order], owner[order]
+        # rank of each child among its siblings
+        first = np.searchsorted(owner, owner, side='left')
+        rank = np.arange(len(owner)) - first
+        keep = rank < k
+        result[owner[keep], rank[keep]] = child[keep]
+        return result
+
+    def lca(self, a, b):
+        '''
+            Lowest common ancestor, NONE if a and b are on different trees
+        '''
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        same = ~self.cyclic[a] & ~self.cyclic[b] & (self.top[a] == self.top[b])
+        da, db = self.depth[a], self.depth[b]
+        a = np.where(da > db, self.ancestor(a, np.maximum(da - db, 0)), a)
+        b = np.where(db > da, self.ancestor(b, np.maximum(db - da, 0)), b)
+        a = np.where(same, a, 0)
+        b = np.where(same, b, 0)
+        for up in reversed(self.up):
+            differ = up[a] != up[b]
+            a = np.where(differ, up[a], a)
+            b = np.where(differ, up[b], b)
+        lca = np.where(a == b, a, self.up[0][a])
+        return np.where(same, lca, NONE)
+
+    def paths(self, sources, targets):
+        '''
+            Nodes on the path from sources to targets through their LCA
+
+            args:
+                sources     .: np.ndarray<int>
+
+                targets     .: np.ndarray<int>
+
+            returns:
+                paths       .: np.ndarray<int> len(sources) x max path length
+                                path[i, 0] is sources[i] NONE padded
+        '''
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        lca = self.lca(sources, targets)
+        found = lca >= 0
+        lca_depth = np.where(found, self.depth[np.maximum(lca, 0)], 0)
+        up_steps = self.depth[sources] - lca_depth
+        down_steps = self.depth[targets] - lca_depth
+        lengths = np.where(found, up_steps + down_steps + 1, 0)
+
+        width = int(lengths.max()) if len(lengths) else 0
+        result = np.full((len(sources), width), NONE, dtype=np.int64)
+        for k in range(width):
+            valid = k < lengths
+            climbing = k <= up_steps
+            node = np.where(climbing,
+                            self.ancestor(sources, np.where(climbing, k, 0)),
+                            self.ancestor(targets, np.where(climbing, 0, lengths - 1 - k)))
+            result[:, k] = np.where(valid, node, NONE)
+        return result
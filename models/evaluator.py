@@ -13,8 +13,17 @@
         SOFTWARE: http://www.lsi.upc.edu/~srlconll/soft.html
 
 '''
+import io
+import os
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
 import models.utils as utils
+from models.conll_scorer import ConllScorer, report
+from models.results import EvaluationResult
 
 
 PEARL_SRLEVAL_PATH = './srlconll-1.1/bin/srl-eval.pl'
@@ -22,7 +31,8 @@ PEARL_SRLEVAL_PATH = './srlconll-1.1/bin/srl-eval.pl'
 
 class Evaluator(object):
     # db, lexicons, columns, ind
-    def __init__(self, db, lexicons, columns, ind, target_dir='./'):
+    def __init__(self, db, lexicons, columns, ind, target_dir='./', perl=False, stream=False,
+                 results=None, workers=2):
         '''
             args:
             ds_type
@@ -30,6 +40,10 @@ class Evaluator(object):
             P       .:  dict<int,int> keys are the index, values are propositions
             PRED    .:  dict<int,str> keys are the index, values are verbs/ predicates
             ARG     .:  dict<int,str> keys are the index, values are ARG
+            perl    .:  bool runs srl-eval.pl instead of the in-process ConllScorer
+            stream  .:  bool with perl feeds srl-eval.pl's stdin, no props file is stored
+            results .:  ResultsStore every evaluation is appended to, None to skip
+            workers .:  int size of the pool running submit's evaluations
         '''                     
         self.db = db
         self.lexicons = lexicons
@@ -37,34 +51,100 @@ class Evaluator(object):
         self.ind = ind
         self.target_dir = target_dir
         self.gold_dir = 'datasets_1.1/props/'
+        self.perl = perl
+        self.stream = stream
+        self.results = results
+        self.workers = workers
+        # gold propositions parsed once per dataset
+        self._scorers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
 
         self._refresh()
 
     def evaluate(self, Y, hparams):
         '''
-            Evaluates the conll scripts returning total precision, recall and F1
-                if self.target_dir is set will also save conll.txt@self.target_dir
-
-            Performs a 6-step procedure in order to use the script evaluation
-            1) Formats      .: inputs in order to obtain proper conll format ()
-            2) Saves      .:  two tmp files tmpgold.txt and tmpy.txt on self.root_dir.
-            3) Run            .:  the perl script using subprocess module.
-            4) Parses     .:  parses results from 3 in variables self.f1, self.prec, self.rec. 
-            5) Stores     .:  stores results from 3 in self.target_dir 
-            6) Cleans     .:  files left from step 2.
-                
+            Evaluates predictions returning total precision, recall and F1
+                also saves the props and conllscore_<ds_type>.txt under self.target_dir
+
+            Performs a 5-step procedure
+            1) Formats      .: predictions into props arrays (bounds, targets, labels).
+            2) Saves        .: <ds_type>.props under self.target_dir, with perl and stream
+                                the props go to an in-memory buffer instead.
+            3) Scores       .: in process with ConllScorer against the cached gold props,
+                                or with srl-eval.pl through subprocess if self.perl
+                                (fed through stdin if self.stream).
+            4) Parses       .: counts or the script's report into an EvaluationResult.
+            5) Stores       .: the report under self.target_dir and appends the result
+                                to self.results when set.
+
+            Use submit to run evaluations concurrently on a pool of self.workers threads.
+
             args:
-                PRED            .: list<string> predicates according to PRED column
-                T               .: list<string> target according to ARG column
-                Y               .: list<string> 
+                Y               .: dict<int, int> predicted HEAD ids per token index
+                                    the dataset is found from the smallest index
+
+                hparams         .: str e.g liblinear's optargs, names the props' directory
+
             returns:
-                prec            .: float<> precision
-                rec       .: float<> recall 
-                f1        .: float<> F1 score
+                result          .: EvaluationResult overall and per-role counts and scores
+                                   also on self.result, precision, recall and f1
         '''
 
         #Resets state
         self._refresh()
+        self.result, self.txt, self.err = self._run(Y, hparams)
+        self._set_result(self.result)
+        return self.result
+
+    def submit(self, Y, hparams):
+        '''
+            Evaluates Y on the worker pool, as evaluate but leaves the
+            evaluator's attributes untouched
+
+            Usage:
+                train = evaluator.submit(train_props, optargs)
+                valid = evaluator.submit(valid_props, optargs)
+                train.result().f1, valid.result().f1
+
+            returns:
+                future          .: concurrent.futures.Future<EvaluationResult>
+        '''
+        return self._pool().submit(lambda: self._run(Y, hparams)[0])
+
+    def shutdown(self, wait=True):
+        '''
+            Stops the worker pool, pending evaluations finish when wait
+        '''
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+        self._executor = None
+
+    def _pool(self):
+        # threads do not survive a fork: forked sweep workers build their own pool
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+        return self._executor
+
+    def _scorer(self, gold_path):
+        with self._lock:
+            if gold_path not in self._scorers:
+                self._scorers[gold_path] = ConllScorer(gold_path)
+            return self._scorers[gold_path]
+
+    def _run(self, Y, hparams):
+        '''
+            Steps 1 to 5 of evaluate
+
+            returns:
+                result          .: EvaluationResult
+
+                txt             .: str srl-eval.pl's report
+
+                err             .: str warnings
+        '''
         #Step 1 - Transforms columns into with args and predictions into a dictionary
         # ready with conll format
         if min(Y) == self.ind['wTreino.conll']['start']:
@@ -77,27 +157,61 @@ class Evaluator(object):
             ds_type = 'test'
             gold_path = '{:}Teste.golden.props'.format(self.gold_dir)
 
-        target_dir = utils.store(ds_type, self.db, self.lexicons, Y, hparams, self.target_dir)
-
-        #Step 3 - Popen runs the pearl script storing in the variable PIPE
-        target_path = '{:}{:}.props'.format(target_dir, ds_type)
-        pipe = subprocess.Popen(['perl',PEARL_SRLEVAL_PATH, gold_path, target_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        #out is a byte with each line separated by \n
-        #ers is stderr      
-        txt, err = pipe.communicate()
-        self.txt = txt.decode('UTF-8')
-        self.err = err.decode('UTF-8')
+        props = utils.props_arrays(self.db, self.lexicons, Y)
+        if self.perl and self.stream:
+            #Step 2 - Props go to srl-eval.pl's stdin ('-') instead of a file
+            buffer = io.StringIO()
+            target_dir = utils.store(ds_type, self.db, self.lexicons, props, hparams, self.target_dir,
+                                     stream=buffer)
+            target_path = '-'
+            stdin = buffer.getvalue().encode('UTF-8')
+        else:
+            target_dir = utils.store(ds_type, self.db, self.lexicons, props, hparams, self.target_dir)
+            target_path = '{:}{:}.props'.format(target_dir, ds_type)
+            stdin = None
+
+        if self.perl:
+            #Step 3 - Popen runs the pearl script storing in the variable PIPE
+            pipe = subprocess.Popen(['perl',PEARL_SRLEVAL_PATH, gold_path, target_path],
+                                    stdin=subprocess.PIPE if stdin is not None else None,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            #out is a byte with each line separated by \n
+            #ers is stderr      
+            txt, err = pipe.communicate(input=stdin)
+            txt = txt.decode('UTF-8')
+            err = err.decode('UTF-8')
+
+            if (err):
+                print('srl-eval.pl says:\t{:}'.format(err))
+
+            #Step 4 - Parse
+            result = EvaluationResult.from_report(txt, ds_type, hparams)
+        else:
+            #Step 3 - Scores in memory against the parsed gold props
+            counts = self._scorer(gold_path).score_arrays(*props)
+            txt = report(counts)
+            err = '\n'.join('WARNING : {:}'.format(w) for w in counts['warnings'])
 
-        if (self.err):
-            print('srl-eval.pl says:\t{:}'.format(self.err))
+            if (err):
+                print('ConllScorer says:\t{:}'.format(err))
 
-        #Step 4 - Parse
-        self._parse(self.txt)
+            #Step 4 - Reads the figures from counts
+            result = EvaluationResult.from_counts(counts, ds_type, hparams)
 
         # Step 5 - Stores
         target_path= '{:}conllscore_{:}.txt'.format(target_dir, ds_type)
-        with open(target_path, 'w+') as f:
-            f.write(self.txt)
+        with open(target_path, mode='w+', encoding='utf-8') as f:
+            f.write(txt)
+        if self.results is not None:
+            self.results.append(result, experiment=os.path.basename(self.target_dir.rstrip('/')))
+        return result, txt, err
+
+    def _set_result(self, result):
+        self.num_sentences = result.sentences
+        self.num_propositions = result.propositions
+        summary = result.summary()
+        self.perc_propositions = summary['perc_propositions']
+        self.precision, self.recall, self.f1 = summary['precision'], summary['recall'], summary['f1']
 
     def _refresh(self):
         self.num_propositions = -1
@@ -108,55 +222,4 @@ class Evaluator(object):
         self.f1 = -1
         self.precision = -1
         self.recall = -1
-
-    def _parse(self, txt):
-        '''
-        Parses srlconll-1.1/bin/srl-eval.pl script output text 
-
-
-
-        args:
-            txt .: string with lines separated by \n and fields separated by tabs
-
-        returns:
-
-        example:
-        Number of Sentences    :         326
-        Number of Propositions :         553
-        Percentage of perfect props :   4.70
-                          corr.  excess  missed    prec.    rec.      F1
-        ------------------------------------------------------------
-                 Overall      398    2068     866    16.14   31.49   21.34
-        ----------
-                    A0      124     285     130    30.32   48.82   37.41
-                    A1      202    1312     288    13.34   41.22   20.16
-                    A2       18     179     169     9.14    9.63    9.37
-                    A3        1      14      15     6.67    6.25    6.45
-                    A4        2      14       9    12.50   18.18   14.81
-                AM-ADV        4      19      19    17.39   17.39   17.39
-                AM-CAU        0      16      17     0.00    0.00    0.00
-                AM-DIR        0       0       1     0.00    0.00    0.00
-                AM-DIS        6      17      20    26.09   23.08   24.49
-                AM-EXT        0       3       5     0.00    0.00    0.00
-                AM-LOC        9      65      46    12.16   16.36   13.95
-                AM-MNR        0      24      28     0.00    0.00    0.00
-                AM-NEG       10       5      24    66.67   29.41   40.82
-                AM-PNC        0       9       9     0.00    0.00    0.00
-                AM-PRD        0      15      18     0.00    0.00    0.00
-                AM-TMP       22      91      68    19.47   24.44   21.67
-        ------------------------------------------------------------
-                     V      457      32      96    93.46   82.64   87.72
-        ------------------------------------------------------------
-
-        '''
-        lines = txt.split('\n')
-        for i, line in enumerate(lines):
-            if (i == 0):
-                self.num_sentences = int(line.split(':')[-1])
-            if (i == 1):
-                self.num_propositions = int(line.split(':')[-1])
-            if (i == 2):
-                self.perc_propositions = float(line.split(':')[-1])
-            if (i == 6):
-                self.precision, self.recall, self.f1 = map(float, line.split()[-3:])
-                break
\ No newline at end of file
+        self.result = None
@@ -0,0 +1,304 @@
+'''
+    @author: Varela
+
+    Binary columnar cache for engineered features
+    * One directory per feature family holding one .npy file per column
+    * header.json records column domains and the lexicon versions the ids refer to
+    * Columns are memory mapped on load
+* Entries are written to a staging directory and renamed in place so
+  concurrent readers never see a partial store
+    * Entries are content addressed: the key digests the conll sources and
+      the feature parameters so stale families are rebuilt and fresh ones reused
+    * The conll datasets themselves are compiled once into a corpus entry holding
+      the coded columns, offsets and lexicons
+'''
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from models.token_table import TokenTable
+
+CACHE_DIR = 'datasets_1.1/cache/'
+HEADER = 'header.json'
+# Bump when the stored layout or a feature engine changes its output
+CACHE_VERSION = 2
+# family of the compiled conll datasets
+CORPUS = 'conll'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    '''
+        sha1 of a file's contents
+    '''
+    digest = hashlib.sha1()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def key(db, family, **params):
+    '''
+        Content address of a feature family
+
+        args:
+            db          .: TokenTable with sources: dict<str, str> dataset -> digest
+
+            family      .: str feature family name e.g column_shifter
+
+            params      .: feature parameters e.g columns, shifts
+
+        returns:
+            key         .: str
+    '''
+    return sources_key(db.sources, family, **params)
+
+
+def sources_key(sources, family, **params):
+    '''
+        Content address from the sources' digests
+
+        args:
+            sources     .: dict<str, str> dataset -> digest
+
+            family      .: str feature family name e.g conll
+    '''
+    content = {
+        'version': CACHE_VERSION,
+        'family': family,
+        'sources': sorted(sources.items()),
+        'params': params,
+    }
+    digest = hashlib.sha1(json.dumps(content, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def exists(family, key, cache_dir=CACHE_DIR):
+    return os.path.isfile(_target_dir(family, key, cache_dir) + HEADER)
+
+
+def lexicon_version(lexicon):
+    '''
+        Digest of a lexicon's tokens in id order
+
+        args:
+            lexicon     .: dict<str, int>
+
+        returns:
+            version     .: str
+    '''
+    tokens = sorted(lexicon, key=lexicon.get)
+    digest = hashlib.sha1('\n'.join(tokens).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def store(table, family, key=None, cache_dir=CACHE_DIR):
+    '''
+        Stores every column of table under cache_dir/family/key
+
+        args:
+            table       .: TokenTable feature block
+
+            family      .: str feature family name e.g column_shifter
+
+            key         .: str content address from key()
+
+        returns:
+            target_dir  .: str
+    '''
+    target_dir = _target_dir(family, key, cache_dir)
+    staging = staging_dir(target_dir)
+
+    header = {'size': table.size, 'columns': [], 'lexicons': {}, 'local': {}}
+    for i, column in enumerate(table.keys()):
+        domain = table.domain(column)
+        filename = '{:03d}.npy'.format(i)
+        np.save(staging + filename, np.ascontiguousarray(table.array(column)))
+        header['columns'].append({'name': column, 'domain': domain, 'file': filename,
+                                  'packed': table.is_packed(column)})
+
+        if domain is not None and domain not in header['lexicons']:
+            lexicon = table.lexicon(domain)
+            header['lexicons'][domain] = lexicon_version(lexicon)
+            if table.is_local(domain):
+                header['local'][domain] = sorted(lexicon, key=lexicon.get)
+
+    with open(staging + HEADER, mode='w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+
+    return publish(staging, target_dir)
+
+
+def load(db, family, key=None, cache_dir=CACHE_DIR):
+    '''
+        Memory maps a stored feature family
+
+        args:
+            db          .: TokenTable the features were computed from
+
+            family      .: str feature family name e.g column_shifter
+
+            key         .: str content address from key()
+
+        returns:
+            table       .: TokenTable feature block sharing db's lexicons
+
+        raises:
+            IOError     .: when missing or stored against other lexicons
+    '''
+    target_dir = _target_dir(family, key, cache_dir)
+    header_path = target_dir + HEADER
+    if not os.path.isfile(header_path):
+        raise IOError('{:} is not cached at {:}'.format(family, target_dir))
+
+    with open(header_path, mode='r', encoding='utf-8') as f:
+        header = json.load(f)
+
+    if header['size'] != db.size:
+        raise IOError('{:} was cached for {:} tokens got {:}'.format(
+            family, header['size'], db.size))
+
+    table = db.derive()
+    for domain, tokens in header['local'].items():
+        table.set_lexicon(domain, dict(zip(tokens, range(len(tokens)))))
+
+    for domain, version in header['lexicons'].items():
+        if domain in header['local']:
+            continue
+        if domain not in db.lexicons or lexicon_version(db.lexicons[domain]) != version:
+            raise IOError('{:} was cached against another {:} lexicon'.format(family, domain))
+
+    for column in header['columns']:
+        arr = np.load(target_dir + column['file'], mmap_mode='r')
+        if column['domain'] is None:
+            table.set_array(column['name'], arr)
+        elif column.get('packed', False):
+            table.set_bits(column['name'], arr, column['domain'])
+        else:
+            table.set_codes(column['name'], arr, column['domain'])
+    return table
+
+
+def store_corpus(db, key, family=CORPUS, cache_dir=CACHE_DIR):
+    '''
+        Stores a compiled conll corpus: every column of db plus its lexicons,
+        dataset offsets and sources
+
+        args:
+            db          .: TokenTable from the conll reader
+
+            key         .: str content address from sources_key()
+
+        returns:
+            target_dir  .: str
+    '''
+    target_dir = _target_dir(family, key, cache_dir)
+    staging = staging_dir(target_dir)
+
+    header = {'size': db.size, 'columns': [], 'lexicons': OrderedDict(),
+              'ind': db.ind, 'sources': db.sources}
+    for i, column in enumerate(db.keys()):
+        domain = db.domain(column)
+        filename = '{:03d}.npy'.format(i)
+        np.save(staging + filename, np.ascontiguousarray(db.array(column)))
+        header['columns'].append({'name': column, 'domain': domain, 'file': filename})
+    for domain, lexicon in db.lexicons.items():
+        header['lexicons'][domain] = sorted(lexicon, key=lexicon.get)
+
+    with open(staging + HEADER, mode='w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False)
+
+    return publish(staging, target_dir)
+
+
+def load_corpus(key, family=CORPUS, cache_dir=CACHE_DIR):
+    '''
+        Memory maps a compiled conll corpus, columns are read-only views
+        shared by every process opening the corpus
+
+        args:
+            key         .: str content address from sources_key()
+
+        returns:
+            db          .: TokenTable
+
+        raises:
+            IOError     .: when it was not compiled
+    '''
+    target_dir = _target_dir(family, key, cache_dir)
+    header_path = target_dir + HEADER
+    if not os.path.isfile(header_path):
+        raise IOError('{:} is not compiled at {:}'.format(family, target_dir))
+
+    with open(header_path, mode='r', encoding='utf-8') as f:
+        header = json.load(f, object_pairs_hook=OrderedDict)
+
+    lexicons = defaultdict(dict)
+    for domain, tokens in header['lexicons'].items():
+        lexicons[domain] = dict(zip(tokens, range(len(tokens))))
+    ind = defaultdict(dict)
+    ind.update((dataset, dict(bounds)) for dataset, bounds in header['ind'].items())
+
+    db = TokenTable(header['size'], lexicons, ind, header['sources'])
+    for column in header['columns']:
+        arr = np.load(target_dir + column['file'], mmap_mode='r')
+        if column['domain'] is None:
+            db.set_array(column['name'], arr)
+        else:
+            db.set_codes(column['name'], arr, column['domain'])
+    return db
+
+
+def staging_dir(target_dir):
+    '''
+        Empty sibling of target_dir an entry is written into before publish
+
+        args:
+            target_dir  .: str entry directory ending in '/'
+
+        returns:
+            staging     .: str directory ending in '/'
+    '''
+    parent, name = os.path.split(target_dir.rstrip('/'))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix='.{:}.'.format(name), dir=parent) + '/'
+
+
+def publish(staging, target_dir):
+    '''
+        Renames a fully written staging directory to target_dir, readers see
+        either the previous entry or the new one. Arrays already memory mapped
+        from the previous entry stay valid after it is removed
+
+        args:
+            staging     .: str directory from staging_dir
+
+            target_dir  .: str entry directory ending in '/'
+
+        returns:
+            target_dir  .: str
+    '''
+    staging, target = staging.rstrip('/'), target_dir.rstrip('/')
+    previous = None
+    if os.path.isdir(target):
+        previous = staging + '.previous'
+        os.rename(target, previous)
+    try:
+        os.rename(staging, target)
+    except OSError:
+        # another process published the same entry in between
+        shutil.rmtree(staging, ignore_errors=True)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+    return target_dir
+
+
+def _target_dir(family, key, cache_dir):
+    if key is None:
+        return '{:}{:}/'.format(cache_dir, family)
+    return '{:}{:}/{:}/'.format(cache_dir, family, key)
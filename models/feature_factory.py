@@ -6,13 +6,29 @@
 '''
 import sys
 sys.path.append('../datasets_1.1')
-from collections import OrderedDict, defaultdict, deque
+import fnmatch
+import multiprocessing
+from collections import OrderedDict, defaultdict
 
-import pandas as pd
-import networkx as nx
+import numpy as np
 
+import models.feature_cache as feature_cache
+from models.conll_reader import ConllReader
+from models.deptree import DepTree, NONE, parents, span_roots
+from models.propositions import PropositionIndex
+from models.token_table import TokenTable, MISSING
+
+
+# Parameters of the feature families, part of their cache keys
+SHIFTER_COLUMNS = ('FORM', 'LEMMA', 'FUNC', 'GPOS')
+SHIFTER_SHIFTS = [d for d in range(-3, 3 + 1, 1) if d != 0]
+CTX_P_COLUMNS = ('FUNC', 'GPOS', 'LEMMA', 'FORM')
+CTX_P_SHIFTS = [d for d in range(-3, 3 + 1, 1)]
+DTREE_COLUMNS = ('FUNC', 'GPOS', 'LEMMA', 'FORM')
+
+# Upper bounds of the predicate distance buckets, farther tokens share the last
+DIST_BUCKETS = (0, 1, 2, 3, 5, 10)
 
-import re
 
 class FeatureFactory(object):
     # Allowed classes to be created
@@ -20,7 +36,7 @@ class FeatureFactory(object):
     def klasses():
         return {'ColumnDepTreeParser', 'ColumnShifter', 'ColumnShifterCTX_P',
                 'ColumnPassiveVoice', 'ColumnPredDist', 'ColumnPredMarker',
-                'ColumnPredMorph'}
+                'ColumnPredMorph', 'ColumnPredRelative'}
 
     # Creates an instance of class given schema and db
     @staticmethod
@@ -87,25 +103,14 @@ class ColumnShifter(object):
             Computes column shifting
             args:
             returns:
-                shifted .: dict<new_columns, dict<int, column<type>>>
+                shifted .: TokenTable<new_columns> lexicon ids, MISSING out of proposition
         '''
         if not ( self.columns or self.shifts or self.mapper):
             raise Exception('Columns to be shifted are undefined run column_shifter.define')
 
-        # defines output data structure
-        self.dict_shifted = {col: OrderedDict({}) for _, col in self.mapper.items()}
-
-        # defines output data structure
-
-        for time, proposition in self.db['P'].items():
-            for col in self.columns:
-                for s in self.shifts:
-                    new_col = self.mapper[(s, col)]
-                    if (time + s in self.db['P']) and\
-                         (self.db['P'][time + s] == proposition):
-                        self.dict_shifted[new_col][time] = self.db[col][time + s]
-                    else:
-                        self.dict_shifted[new_col][time] = None
+        # every token is shifted around itself
+        times = np.arange(self.db.size)
+        self.dict_shifted = _shift(self.db, self.mapper, self.shifts, times)
 
         return self.dict_shifted
 
@@ -165,66 +170,92 @@ class ColumnShifterCTX_P(object):
             Computes column shifting
             args:
             returns:
-                shifted .: dict<new_columns, dict<int, column<type>>>
+                shifted .: TokenTable<new_columns> lexicon ids, MISSING out of proposition
         '''
         if not ( self.columns or self.shifts or self.mapper):
             raise Exception('Columns to be shifted are undefined run column_shifter.define')
 
-        # defines output data structure
-        self.dict_shifted = {col: OrderedDict({}) for _, col in self.mapper.items()}
-
-        # defines output data structure
-        times = []
-        predicate_d = _predicatedict(self.db)
-        for time, proposition in self.db['P'].items():
-            predicate_time =  predicate_d[proposition]
-
-            for col in self.columns:
-                for s in self.shifts:
-                    new_col = self.mapper[(s, col)]
-                    if (predicate_time + s in self.db['P']) and\
-                         (self.db['P'][predicate_time + s] == proposition):
-                        self.dict_shifted[new_col][time] = self.db[col][predicate_time + s]
-                    else:
-                        self.dict_shifted[new_col][time] = None
+        # every token is shifted around its proposition's predicate
+        predicate_times = _propositions(self.db).predicate_times()
+        self.dict_shifted = _shift(self.db, self.mapper, self.shifts, predicate_times)
 
         return self.dict_shifted
 
 
-class ColumnPredDist(object):
+class ColumnPredRelative(object):
     '''
-        Computes the distance to the predicate
+        Predicate relative numerical features, every defined column is
+        computed in one batched pass over the proposition index
+
+        PRED_DIST           .: predicate_time - time
+        PRED_DIST_BUCKET    .: signed bucket of PRED_DIST see DIST_BUCKETS
+        PRED_MARKER         .: 0 before the predicate 1 otherwise
+        PASSIVE_VOICE       .: 1 if the proposition's last LEMMA=ser precedes the
+                                predicate and its last GPOS=V-PCP is the predicate
 
         Usage:
-            See below (main)
+            relative = ColumnPredRelative(db).define(('PRED_DIST', 'PRED_MARKER'))
+            table = relative.run()
     '''
+    COLUMNS = ('PRED_DIST', 'PRED_DIST_BUCKET', 'PRED_MARKER', 'PASSIVE_VOICE')
+
     def __init__(self, dict_db):
         self.db = dict_db
+        self.columns = self.COLUMNS
 
+    def define(self, columns):
+        '''
+            Defines which features to compute
+
+            args:
+                columns .: list<str> columns in ColumnPredRelative.COLUMNS
+
+            returns:
+                relative .: object<ColumnPredRelative>
+        '''
+        unknown = set(columns) - set(ColumnPredRelative.COLUMNS)
+        if unknown:
+            raise ValueError('Unknown columns {:}'.format(unknown))
+        self.columns = tuple(columns)
+        return self
 
     def run(self):
         '''
-            Computes the distance to the target predicate
+            Computes the defined features
             args:
             returns:
-                preddist .: dict<PRED_DIST, OrderedDict<int, int>>
+                relative .: TokenTable<columns> int32 arrays
         '''
-        # defines output data structure
-        self.preddist = {'PRED_DIST': OrderedDict({})}
+        propositions = _propositions(self.db)
+        distance = propositions.predicate_times() - np.arange(self.db.size)
+
+        self.relative = self.db.derive()
+        for column in self.columns:
+            if column == 'PRED_DIST':
+                values = distance
+            elif column == 'PRED_DIST_BUCKET':
+                buckets = np.searchsorted(DIST_BUCKETS, np.abs(distance))
+                values = np.sign(distance) * buckets
+            elif column == 'PRED_MARKER':
+                values = distance <= 0
+            else:
+                values = _passive_voice(self.db, propositions)
+            self.relative.set_array(column, values.astype(np.int32))
 
-        # Finds predicate position
-        predicate_d = _predicatedict(self.db)
-        for time, proposition in self.db['P'].items():
-            predicate_time = predicate_d[proposition]
+        return self.relative
 
 
-            self.preddist['PRED_DIST'][time] = predicate_time - time
+class ColumnPredDist(ColumnPredRelative):
+    '''
+        Computes the distance to the predicate
 
-        
-        return self.preddist
+        Usage:
+            See below (main)
+    '''
+    COLUMNS = ('PRED_DIST',)
 
 
-class ColumnPassiveVoice(object):
+class ColumnPassiveVoice(ColumnPredRelative):
     '''
         Passive voice indicator
         1 if POS of target verb GPOS=v-pcp and is preceeded by LEMMA=ser
@@ -232,44 +263,10 @@ class ColumnPassiveVoice(object):
         Usage:
             See below (main)
     '''
+    COLUMNS = ('PASSIVE_VOICE',)
 
-    def __init__(self, dict_db):
-        self.db = dict_db
-
-    def run(self):
-        '''
-            Computes the distance to the target predicate
-            args:
-            returns:
-                passive_voice .: dict<PASSIVE_VOICE, OrderedDict<int, int>>
-        '''
-        # defines output data structure
-        self.passive_voice = {'PASSIVE_VOICE': OrderedDict({})}
-
-        # Finds predicate position
-        predicate_d = _predicatedict(self.db)
-        pos_d = {
-            self.db['P'][time]: time
-            for time, pos in self.db['GPOS'].items() if pos == 'V-PCP'
-        }
-        lemma_d = {
-            self.db['P'][time]: time
-            for time, lem in self.db['LEMMA'].items() if lem == 'ser'
-        }
-        
-        for time, proposition in self.db['P'].items():
-            predicate_time = predicate_d[proposition]
-            lemma_time = lemma_d.get(proposition, None)
-            pos_time = pos_d.get(proposition, None)
-            if lemma_time and pos_time:
-                self.passive_voice['PASSIVE_VOICE'][time] = 1 if lemma_time < predicate_time and pos_time == predicate_time else 0
-            else:
-                self.passive_voice['PASSIVE_VOICE'][time] = 0 
-
-        return self.passive_voice
 
-
-class ColumnPredMarker(object):
+class ColumnPredMarker(ColumnPredRelative):
     '''
         Marks if we are in the predicate context
         1 if time > predicate_time
@@ -278,28 +275,7 @@ class ColumnPredMarker(object):
         Usage:
             See below (main)
     '''
-
-    def __init__(self, dict_db):
-        self.db = dict_db
-
-    def run(self):
-        '''
-            Computes the distance to the target predicate
-            args:
-            returns:
-                preddist .: dict<PRED_DIST, OrderedDict<int, int>>
-        '''
-        # defines output data structure
-        self.predmarker = {'PRED_MARKER': OrderedDict({})}
-
-        # Finds predicate position
-        predicate_d = _predicatedict(self.db)
-        for time, proposition in self.db['P'].items():
-            predicate_time = predicate_d[proposition]
-
-            self.predmarker['PRED_MARKER'][time] = 0 if predicate_time - time > 0 else 1
-
-        return self.predmarker
+    COLUMNS = ('PRED_MARKER',)
 
 
 class ColumnPredMorph(object):
@@ -308,6 +284,10 @@ class ColumnPredMorph(object):
         the field MORF is multivalued and is pipe separator ('|')
         Receives 1 if attribute is present 0 otherwise 
 
+        The flags are packed into one PRED_MORPH bitmask per token, bit i
+        is the i-th sorted flag. Masks are computed once per distinct MORF
+        value and broadcast through its lexicon ids
+
         Usage:
             See below (main)
     '''
@@ -316,39 +296,28 @@ class ColumnPredMorph(object):
 
     def run(self):
         '''
-            Computes 32 item list of zeros and ones
+            Computes the bitmask of single flags
             args:
             returns:
-                predmorph .: dict<PRED_MORPH, OrderedDict<int, int>>
+                predmorph .: TokenTable<PRED_MORPH> packed against the
+                                local PRED_MORPH lexicon of flags
         '''
-        # defines output data structure
-        self.predmorph = {'PRED_MORPH': OrderedDict({})}
-
         # Finds all single flag
-        composite_morph = sorted(list(set(self.db['MORF'].values())))
-
-        morph = [item
-                 for sublist in
-                 [m.split('|') for m in composite_morph]
-                 for item in sublist]
-
-        morph = sorted(list(set(morph)))
-        rng = range(len(morph))
-        morph2idx = dict(zip(morph, rng))
-
-
-        for time, morph_comp in self.db['MORF'].items():
-            _features = [1 if m in morph_comp.split('|') else 0
-                         for m in morph2idx]
-
-            _features = {
-                'PredMorph_{:02d}'.format(i + 1):feat_i
-                for i, feat_i in enumerate(_features)}
-
-            for key, val in _features.items():
-                if key not in self.predmorph['PRED_MORPH']:
-                    self.predmorph['PRED_MORPH'][key] = OrderedDict({})
-                self.predmorph['PRED_MORPH'][key][time] = val
+        morph = _morph_flags(self.db)
+        morph2idx = dict(zip(morph, range(len(morph))))
+        dtype = np.uint32 if len(morph) <= 32 else np.uint64
+
+        # one mask per MORF lexicon entry
+        composite_morph = self.db.inverse(self.db.domain('MORF'))
+        masks = np.zeros(len(composite_morph), dtype=dtype)
+        for i, morph_comp in enumerate(composite_morph):
+            for m in set(morph_comp.split('|')):
+                if m in morph2idx:
+                    masks[i] |= dtype(1) << dtype(morph2idx[m])
+
+        self.predmorph = self.db.derive()
+        self.predmorph.set_lexicon('PRED_MORPH', morph2idx)
+        self.predmorph.set_bits('PRED_MORPH', masks[self.db.codes('MORF')], 'PRED_MORPH')
 
         return self.predmorph
 
@@ -381,236 +350,197 @@ class ColumnDepTreeParser(object):
 
     def run(self):
         '''
-            Computes the distance to the target predicate
+            Computes parent, grand parent, first 3 children and the path
+            to the target predicate for every token
+
+            Propositions are copies of a sentence, one per predicate, so the
+            tree is built once per sentence over its first proposition and
+            only the predicate paths are computed per proposition
+
+            returns:
+                kernel      .: TokenTable<feature columns> lexicon ids MISSING if absent
         '''
-        # defines output data structure
-        self.kernel = defaultdict(OrderedDict)
-
-        # finds predicate time 
-        predicate_d = _predicatedict(self.db)
-        lb = 0
-        ub = 0
-        prev_prop = -1
-        prev_time = -1
-        process = False
-        for time, proposition in self.db['P'].items():
-            if prev_prop < proposition:
-                if prev_prop > 0:
-                    lb = ub
-                    ub = prev_time + 1  # ub must be inclusive
-                    process = True
-
-            if process:
-                self._dtree_parse(predicate_d[prev_prop], lb, ub)
-
-            process = False
-            prev_prop = proposition
-            prev_time = time
-
-        # PROCESS LAST PROPOSITION
-        lb = ub
-        ub = prev_time + 1
-        self._dtree_parse(predicate_d[prev_prop], lb, ub)
+        propositions = _propositions(self.db)
+        lb, ub = propositions.bounds()
+        index = np.arange(self.db.size)
+
+        # tokens of the first proposition of each sentence
+        representative = _sentence_tokens(propositions)
+        shared = np.flatnonzero(representative == index)
+        position = np.full(self.db.size, NONE, dtype=np.int64)
+        position[shared] = np.arange(len(shared))
+
+        ids = _integers(self.db, 'ID')[shared]
+        heads = _integers(self.db, 'DTREE')[shared]
+        parent = parents(ids, heads, position[lb[shared]], position[ub[shared] - 1] + 1)
+        root = span_roots(heads, position[lb[shared]], position[ub[shared] - 1] + 1)
+        tree = DepTree(parent)
+
+        # ancestors and children are found searching from the root
+        reachable = (root >= 0) & (tree.top == root)
+        children = tree.children(3)
+        lookup_nodes = OrderedDict((
+            ('parent', tree.ancestor(np.arange(len(shared)), 1)),
+            ('grand_parent', tree.ancestor(np.arange(len(shared)), 2)),
+            ('child_1', children[:, 0]),
+            ('child_2', children[:, 1]),
+            ('child_3', children[:, 2]),
+        ))
+
+        # maps nodes of the shared sentence back onto each proposition
+        sentence = position[representative]
+        offset = index - representative
+
+        def _broadcast(nodes):
+            return np.where(nodes >= 0, shared[nodes] + offset, NONE)
+
+        self.kernel = self.db.derive()
+        for key, nodes in lookup_nodes.items():
+            nodes = np.where(reachable, nodes, NONE)[sentence]
+            nodes = _broadcast(nodes)
+            for col in self.columns:
+                new_key = '{:}_{:}'.format(col, key).upper()
+                self._set_nodes(new_key, col, nodes)
+
+        # paths from token to predicate
+        predicates = position[representative[propositions.predicate_times()]]
+        paths = tree.paths(sentence, predicates)
+        for k in range(paths.shape[1]):
+            nodes = _broadcast(paths[:, k])
+            for col in self.columns:
+                if col in ('GPOS', 'FUNC'):
+                    new_key = '{:}_{:02d}'.format(col, k).upper()
+                    self._set_nodes(new_key, col, nodes)
 
         return self.kernel
 
-    def _dtree_parse(self, search_pred, lb, ub):
-        '''
-            Builds graph using tokens from lb to ub
-                * Compute ancestor features for each i in [lb, ub)
-                * Compute paths from predicate token to each token in  [lb, ub)
+    def _set_nodes(self, new_key, col, nodes):
+        codes = self.db.codes(col)
+        self.kernel.set_codes(
+            new_key, np.where(nodes >= 0, codes[nodes], MISSING), self.db.domain(col))
 
-            args:
-                predicates  .: dict<int, int>
-                                keys: proposition index
-                                values: predicate within proposition
-                lb          .: integer representing begining from predicate
-                ub          .: integer representing finish of predicate
 
-            returns:
-                kernel      .: dict<str, dict<int, int>>
-                                outer_keys: feature columns
-                                inner_keys: index of feature token
-                                values: feature representation
-        '''
-        G, root = self._build(lb, ub)
+def _sentence_tokens(propositions):
+    '''
+        Token at the same position in the first proposition of the sentence,
+        propositions with equal ID, FORM and DTREE columns are copies of the
+        same sentence even when they are not adjacent
 
-        for i in range(lb, ub):
-            # Find children, parent and grand-parent
-            self._dtreeparse_ancestors(G, root, i)
+        args:
+            propositions    .: PropositionIndex
 
-            # Find path to predicate
-            # search_pred = predicates[prev_prop]
-            self._dtreeparse_paths(G, search_pred, i)
+        returns:
+            representative  .: np.ndarray<int>
+    '''
+    offset = propositions.sentence_starts() - propositions.start
+    lengths = propositions.finish - propositions.start
+    return np.repeat(offset, lengths) + np.arange(lengths.sum())
 
 
-    def _dtreeparse_ancestors(self, G, search_root, search_token):
-        '''
-        Finds first 3 children, parent and grand-parent
+def _morph_flags(db):
+    '''
+        Sorted single flags of the multivalued MORF column
+    '''
+    composite_morph = db.inverse(db.domain('MORF'))[np.unique(db.codes('MORF'))]
+
+    morph = [item
+             for sublist in
+             [m.split('|') for m in composite_morph]
+             for item in sublist]
+
+    return sorted(list(set(morph)))
+
+
+def _integers(db, column):
+    '''
+        Converts a categorical column holding integers into an array
+    '''
+    values = np.array([int(token) for token in db.inverse(db.domain(column))], dtype=np.int64)
+    return values[db.codes(column)]
+
+
+def _passive_voice(db, propositions):
+    '''
+        Passive voice indicator for every token, as the token loop it replaces
+        only the last LEMMA=ser and the last GPOS=V-PCP of a proposition count
+        and either at time 0 reads as absent
 
         args:
-            G     .: Graph build from DTree
-            root  .: root of the tree
-            lb    .: index of the first node
-            ub    .: index of the last node
+            db              .: TokenTable with GPOS and LEMMA
+
+            propositions    .: PropositionIndex
 
         returns:
-            kernel      .: dict<str, dict<int, int>>
-                            outer_keys: feature columns
-                            inner_keys: index of feature token
-                            values: feature representation
-        '''
-        result = self._make_lookupnodes()
-        q = deque(list())
-        self._dfs_lookup(G, search_root, search_token, q, result)
-        for key, nodeidx in result.items():
-            for col in self.columns:
-                new_key = '{:}_{:}'.format(col, key).upper()
-                if nodeidx is None:
-                    self.kernel[new_key][search_token] = None
-                else:
-                    self.kernel[new_key][search_token] = self.db[col][nodeidx]
-        self._refresh(G)
+            voice           .: np.ndarray<bool>
+    '''
+    owners = propositions.propositions()
+    pos_time = _last_match(db, 'GPOS', 'V-PCP', owners, len(propositions))
+    lemma_time = _last_match(db, 'LEMMA', 'ser', owners, len(propositions))
+    predicate = propositions.predicate
+    voice = (lemma_time > 0) & (pos_time > 0) & (lemma_time < predicate) & (pos_time == predicate)
+    return voice[owners]
 
-    def _dtreeparse_paths(self, G, search_pred, search_token):
-        '''
-        Finds first 3 children, parent and grand-parent
+
+def _last_match(db, column, token, owners, n):
+    '''
+        Last time column equals token within each proposition, MISSING if none
 
         args:
-            G     .: Graph build from DTree
-            pred  .: predicate index
-            lb    .: index of the first node
-            ub    .: index of the last node
+            owners      .: np.ndarray<int> proposition of every token
 
-        returns:
-            kernel      .: dict<str, dict<int, int>>
-                            outer_keys: feature columns
-                            inner_keys: index of feature token
-                            values: feature representation        
-        '''
-        result = {}
-        q = deque(list())
-        self._dfs_path(G, search_token, search_pred, q, result)
-        for key, nodeidx in result.items():
-            for col in self.columns:
-                if col in ('GPOS', 'FUNC'):
-                    _key = key.split('_')[0]
-                    new_key = '{:}_{:}'.format(col, _key).upper()
-                    if nodeidx is None:
-                        self.kernel[new_key][search_token] = None
-                    else:
-                        self.kernel[new_key][search_token] = self.db[col][nodeidx]
-        self._refresh(G)
-
-    def _make_lookupnodes(self):
-        _list_keys = ['parent', 'grand_parent', 'child_1', 'child_2', 'child_3']
-        return dict.fromkeys(_list_keys)
-
-    def _update_lookupnodes(self, children_l, ancestors_q, lookup_nodes):
-        self._update_ancestors(ancestors_q, lookup_nodes)
-        self._update_children(children_l, lookup_nodes)
-
-    def _update_path(self, ancestors_q, lookup_nodes):
-        for i, nidx in enumerate(ancestors_q):
-            _key = '{:02d}_node'.format(i)
-            lookup_nodes[_key] = nidx
-
-    def _update_ancestors(self, ancestors_q, lookup_nodes):
-        try:
-            lookup_nodes['parent'] = ancestors_q.pop()
-            lookup_nodes['grand_parent'] = ancestors_q.pop()
-        except IndexError:
-            pass
-
-    def _update_children(self, children_l, lookup_nodes):
-        n = 0
-        for v in children_l:
-            if (not v == lookup_nodes['parent']):
-                key = 'child_{:}'.format(n + 1)
-                lookup_nodes[key] = v
-                n += 1
-            if n == 3:
-                break
-
-    def _dfs_lookup(self, G, u, i, q, lookup_nodes):
-        G.nodes[u]['discovered'] = True
-        # updates ancestors if target i is undiscovered
-        if not G.nodes[i]['discovered']:
-            q.append(u)
-
-        # current node u is target node i
-        if i == u:
-            self._update_lookupnodes(G.neighbors(u), q, lookup_nodes)
-            return False
-        else:
-            # keep looking
-            for v in G.neighbors(u):
-                if not G.node[v]['discovered']:
-                    search = self._dfs_lookup(G, v, i, q, lookup_nodes)
-                    if not search:
-                        return False
-
-        if not G.nodes[i]['discovered']:
-            q.pop()
-        return True
-
-    def _dfs_path(self, G, u, i, q, path_nodes):
-        # updates ancestors if target i is undiscovered
-        if not G.nodes[i]['discovered']:
-            q.append(u)
-        G.nodes[u]['discovered'] = True
-
-        # current node u is target node i
-        if i == u:
-            self._update_path(q, path_nodes)
-            return False
-        else:
-            # keep looking
-            for v in G.neighbors(u):
-                if not G.node[v]['discovered']:
-                    search = self._dfs_path(G, v, i, q, path_nodes)
-                    if not search:
-                        return False
-
-        if not G.nodes[i]['discovered']:
-            q.pop()
-        return True
-
-
-    def _refresh(self, G):
-        for u in G:
-            G.nodes[u]['discovered'] = False
-
-    def _build(self, lb, ub):
-        G = nx.Graph()
-        root = None
-        for i in range(lb, ub):
-            G.add_node(int(i), **self._crosssection(int(i)))
-
-        for i in range(lb, ub):
-            v = int(G.node[i]['DTREE'])  # reference to the next node
-            u = int(G.node[i]['ID'])  # reference to the current node within proposition
-            if v == 0:
-                root = i
-            else:
-                G.add_edge(i, (v - u) + i)
+            n           .: int number of propositions
+    '''
+    times = np.full(n, MISSING, dtype=np.int64)
+    code = db.lexicon(db.domain(column)).get(token, None)
+    matches = np.flatnonzero(db.codes(column) == code) if code is not None else []
+    if not len(matches):
+        return times
+    matched = owners[matches]
+    last = np.append(matched[1:] != matched[:-1], True)
+    times[matched[last]] = matches[last]
+    return times
+
+
+def _propositions(db):
+    '''
+        PropositionIndex of db, built on first use when db was not
+        loaded by _process_conll
+    '''
+    if db.propositions is None:
+        db.propositions = PropositionIndex.build(db)
+    return db.propositions
 
-        return G, root
 
-    def _crosssection(self, idx):
-        list_keys = list(self.db.keys())
-        d = {key: self.db[key][idx] for key in list_keys}
+def _shift(db, mapper, shifts, anchors):
+    '''
+        Shifts columns around anchors respecting proposition bounds
+        all shifts are gathered at once as a tokens x shifts index matrix
 
-        d['discovered'] = False
-        return d
+        args:
+            db          .: TokenTable
 
+            mapper      .: OrderedDict<(int, str), str> (shift, column) -> new column
 
-def _predicatedict(db):
-    d = {
-        db['P'][time]: time
-        for time, pred in db['PRED'].items() if (pred != '-')
-    }
-    return d
+            shifts      .: list<int> sorted shifts
+
+            anchors     .: np.ndarray<int> position around which each token is shifted
+
+        returns:
+            shifted     .: TokenTable<new_columns> lexicon ids, MISSING out of proposition
+    '''
+    lb, ub = _propositions(db).bounds()
+    target = anchors[:, None] + np.asarray(shifts, dtype=np.int64)[None, :]
+    valid = (target >= lb[:, None]) & (target < ub[:, None])
+    target[~valid] = 0
+
+    shifted = db.derive()
+    gathered = {}
+    for (s, col), new_col in mapper.items():
+        if col not in gathered:
+            codes = db.codes(col)
+            gathered[col] = np.where(valid, codes[target], MISSING)
+        shifted.set_codes(new_col, gathered[col][:, shifts.index(s)], db.domain(col))
+    return shifted
 
 
 def get_shifter(db, refresh=True):
@@ -620,50 +550,27 @@ def get_shifter(db, refresh=True):
         (BELTRAO, 2016) pg 47
 
         args:
-            db          .: dict<str, dict<int, ?>>
-                            outer_keys  .: str columns which should contain all base conll attributes
-
-                            inner_keys  .: int token index
-                            ?           .: either text or numerical value
+            db          .: TokenTable
+                            columns     .: str columns which should contain all base conll attributes
 
             refresh    .: boolean if true recompute attributes and store
+                            otherwise recompute only if the cache is stale
 
         returns:
-            windows    .: dict<int, dict<int, ?>>
-                            outer_keys  .: str columns representing the new shifter features
-                            inner_keys  .: int token index
-                            ?           .: either text or numerical value
-
-    '''
-    columns_shift = ('FORM', 'LEMMA', 'FUNC', 'GPOS')
-    if refresh:
-        delta = 3
-        shifts = [d for d in range(-delta, delta + 1, 1) if d != 0]
-        windows = _process_shifter(db, columns_shift, shifts)
-    else:
-        windows = _load_shifter(db, columns_shift)
-
-    return windows
-
-
-def _load_shifter(dictdb, columns):
-    target_dir = 'datasets_1.1/csvs/column_shifter/'
-    shifted = defaultdict(dict)
-    for col in columns:
-        target_path = '{:}{:}.csv'.format(target_dir, col.lower())
-        _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-        shifted.update(_df.to_dict())
-    return shifted
+            windows    .: TokenTable
+                            columns     .: str columns representing the new shifter features
+
+    '''
+    return _run_stages(db, select_stages(('windows',)), refresh)
 
 
-def _process_shifter(dictdb, columns, shifts, store=True):
+def _process_shifter(db, columns, shifts, store=True, key=None):
 
-    shifter = FeatureFactory().make('ColumnShifter', dictdb)
-    target_dir = 'datasets_1.1/csvs/column_shifter/'
+    shifter = FeatureFactory().make('ColumnShifter', db)
     shifted = shifter.define(columns, shifts).run()
 
     if store:
-        _store_columns(shifted, columns, target_dir)
+        feature_cache.store(shifted, 'column_shifter', key)
 
     return shifted
 
@@ -675,284 +582,501 @@ def get_ctx_p(db, refresh=True):
         (BELTRAO, 2016) pg 47
 
         args:
-            db          .: dict<str, dict<int, ?>>
-                            outer_keys  .: str columns which should contain all base conll attributes
-
-                            inner_keys  .: int token index
-                            ?           .: either text or numerical value
+            db          .: TokenTable
+                            columns     .: str columns which should contain all base conll attributes
 
             refresh    .: boolean if true recompute attributes and store
+                            otherwise recompute only the families whose cache is stale
 
         returns:
-            context    .: dict<int, dict<int, ?>>
-                            outer_keys  .: str columns representing the new context features
-                            inner_keys  .: int token index
-                            ?           .: either text or numerical value
+            context    .: TokenTable
+                            columns     .: str columns representing the new context features
 
     '''
-    column_shifts_ctx_p = ('FUNC', 'GPOS', 'LEMMA', 'FORM')
-    if refresh:
-        delta = 3
-        shifts = [d for d in range(-delta, delta + 1, 1)]
-        contexts = _process_shifter_ctx_p(db, column_shifts_ctx_p, shifts)
-
-        preddist = _process_predicate_dist(db)
-        passive_voice = _process_passivevoice(db)
-        predmorph = _process_predmorph(db)
-        predmarker = _process_predicate_marker(db)
-
-    else:
-        contexts = _load_ctx_p(column_shifts_ctx_p)
+    return _run_stages(db, select_stages(('context',)), refresh)
 
-        preddist = _load_predicate_dist()
-        passive_voice = _load_passivevoice()
-        predmorph = _load_predmorph()
-        predmarker = _load_predicate_marker()
 
-    contexts.update(preddist)
-    contexts.update(passive_voice)
-    contexts.update(predmorph)
-    contexts.update(predmarker)
-
-    return contexts
-
-
-def _process_shifter_ctx_p(db, columns, shifts, store=True):
+def _process_shifter_ctx_p(db, columns, shifts, store=True, key=None):
 
     shifter = FeatureFactory().make('ColumnShifterCTX_P', db)
-    target_dir = 'datasets_1.1/csvs/column_shifts_ctx_p/'
     shifted = shifter.define(columns, shifts).run()
 
     if store:
-        _store_columns(shifted, columns, target_dir)
+        feature_cache.store(shifted, 'column_shifts_ctx_p', key)
 
     return shifted
 
 
-def _load_ctx_p(columns):
-    target_dir = 'datasets_1.1/csvs/column_shifts_ctx_p/'
-    ctx_p = defaultdict(dict)
-    for col in columns:
-        target_path = '{:}{:}.csv'.format(target_dir, col.lower())
-        _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-        ctx_p.update(_df.to_dict())
-    return ctx_p
-
-
-def _process_passivevoice(dictdb, store=True):
-    pvoice_marker = FeatureFactory().make('ColumnPassiveVoice', dictdb)
-    target_dir = 'datasets_1.1/csvs/column_passivevoice/'
+def _process_passivevoice(db, store=True, key=None):
+    pvoice_marker = FeatureFactory().make('ColumnPassiveVoice', db)
     passivevoice = pvoice_marker.run()
 
     if store:
-        _store(passivevoice, 'passive_voice', target_dir)
+        feature_cache.store(passivevoice, 'column_passivevoice', key)
 
     return passivevoice
 
 
-def _load_passivevoice():
-    target_dir = 'datasets_1.1/csvs/column_passivevoice/'
-    passive_voice = defaultdict(dict)
+def _process_predmorph(db, store=True, key=None):
 
-    target_path = '{:}passive_voice.csv'.format(target_dir)
-    _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-    passive_voice.update(_df.to_dict())
+    morpher = FeatureFactory().make('ColumnPredMorph', db)
+    predmorph = morpher.run()
 
-    return passive_voice
+    if store:
+        feature_cache.store(predmorph, 'column_predmorph', key)
 
+    return predmorph
 
-def _process_predmorph(dictdb, store=True):
 
-    morpher = FeatureFactory().make('ColumnPredMorph', dictdb)
-    target_dir = 'datasets_1.1/csvs/column_predmorph/'
-    predmorph = morpher.run()
+def _process_predicate_dist(db, store=True, key=None):
+
+    pred_dist = FeatureFactory().make('ColumnPredDist', db)
+    d = pred_dist.run()
 
     if store:
-        _store(predmorph['PRED_MORPH'], 'pred_morph', target_dir)
+        feature_cache.store(d, 'column_preddist', key)
 
-    return predmorph['PRED_MORPH']
+    return d
 
 
-def _load_predmorph():
-    target_dir = 'datasets_1.1/csvs/column_predmorph/'
-    predmorph = defaultdict(dict)
+def _process_predicate_marker(db, store=True, key=None):
 
-    target_path = '{:}pred_morph.csv'.format(target_dir)
-    _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-    predmorph.update(_df.to_dict())
+    column_predmarker = FeatureFactory().make('ColumnPredMarker', db)
+    d = column_predmarker.run()
 
-    return predmorph
+    if store:
+        feature_cache.store(d, 'column_predmarker', key)
 
+    return d
 
-def _process_predicate_dist(dictdb):
 
-    pred_dist = FeatureFactory().make('ColumnPredDist', dictdb)
-    d = pred_dist.run()
+def get_dtree(db, refresh):
+    '''
+        Builds dtree attributes
+        for golden standard columns ('FUNC', 'GPOS', 'LEMMA', 'FORM')
+        (BELTRAO, 2016) pg 50
 
-    target_dir = 'datasets_1.1/csvs/column_preddist/'
-    filename = '{:}{:}.csv'.format(target_dir, 'predicate_distance')
-    pd.DataFrame.from_dict(d).to_csv(filename, sep=',', encoding='utf-8')
+        args:
+            db          .: TokenTable
+                            columns     .: str columns which should contain all base conll attributes
 
-    return d
+            refresh    .: boolean if true recompute attributes and store
+                            otherwise recompute only if the cache is stale
 
+        returns:
+            dtree    .: TokenTable
+                            columns     .: str columns representing the new dtree features
+    '''
+    return _run_stages(db, select_stages(('dtree',)), refresh)
 
-def _load_predicate_dist():
-    target_dir = 'datasets_1.1/csvs/column_preddist/'
-    predicate_dist = defaultdict(dict)
 
-    target_path = '{:}predicate_distance.csv'.format(target_dir)
-    _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-    predicate_dist.update(_df.to_dict())
-    return predicate_dist
+def _process_dtree(db, columns, store=True, key=None):
 
+    dtree = FeatureFactory().make('ColumnDepTreeParser', db)
+    dtree_features = dtree.define(columns).run()
 
-def _process_predicate_marker(dictdb, store=True):
+    if store:
+        feature_cache.store(dtree_features, 'column_deptree', key)
 
-    column_predmarker = FeatureFactory().make('ColumnPredMarker', dictdb)
-    d = column_predmarker.run()
+    return dtree_features
 
-    target_dir = 'datasets_1.1/csvs/column_predmarker/'
-    filename = '{:}{:}.csv'.format(target_dir, 'predicate_marker')
-    if store:
-        pd.DataFrame.from_dict(d).to_csv(filename, sep=',', encoding='utf-8')
 
-    return d
+class Stage(object):
+    '''
+        Feature family of the pipeline: declares the columns it reads and
+        the columns it writes, run reads only the former
 
+        Usage:
+            stage = Stage('column_preddist', 'context', ('P', 'PRED'), ('PRED_DIST',),
+                          lambda db, key: _process_predicate_dist(db, key=key))
+    '''
+    def __init__(self, family, group, requires, produces, build, compute=None, **params):
+        '''
+            args:
+                family      .: str feature cache family
 
-def _load_predicate_marker():
-    target_dir = 'datasets_1.1/csvs/column_predmarker/'
-    predicate_marker = defaultdict(dict)
+                group       .: str feature set the family belongs to
+                                context, dtree or windows
 
-    target_path = '{:}predicate_marker.csv'.format(target_dir)
-    _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-    predicate_marker.update(_df.to_dict())
-    return predicate_marker
+                requires    .: tuple<str> columns read
 
+                produces    .: tuple<str> columns written or fnmatch patterns
+                                for data dependent ones e.g 'GPOS_[0-9][0-9]'
 
-def get_dtree(db, refresh):
+                build       .: function(db, key) computes, stores and returns
+                                the family's TokenTable
+
+                compute     .: function(db) computes the family's TokenTable
+                                without storing it, set for engines whose output
+                                over a range of whole propositions depends only on
+                                that range; the parallel build shards them
+
+                params      .: feature parameters, part of the cache key
+        '''
+        self.family = family
+        self.group = group
+        self.requires = tuple(requires)
+        self.produces = tuple(produces)
+        self.build = build
+        self.compute = compute
+        self.params = params
+
+    def key(self, db):
+        return feature_cache.key(db, self.family, **self.params)
+
+    def provides(self, column):
+        return any(fnmatch.fnmatchcase(column, pattern) for pattern in self.produces)
+
+    def run(self, db, key, refresh):
+        '''
+            Family's TokenTable, computed over the required columns when
+            stale otherwise read from the cache
+        '''
+        if _stale(self.family, key, refresh):
+            return self.build(db.select(self.requires), key)
+        return feature_cache.load(db, self.family, key)
+
+
+_CTX_P_REQUIRES = ('P', 'PRED') + CTX_P_COLUMNS
+_DTREE_REQUIRES = ('P', 'PRED', 'ID', 'FORM', 'DTREE') + DTREE_COLUMNS
+
+# Feature families in the order their columns are added to db
+PIPELINE = (
+    Stage('column_shifts_ctx_p', 'context', _CTX_P_REQUIRES,
+          ['{:}_CTX_P{:+d}'.format(c, d) for c in CTX_P_COLUMNS for d in CTX_P_SHIFTS],
+          lambda db, key: _process_shifter_ctx_p(db, CTX_P_COLUMNS, CTX_P_SHIFTS, key=key),
+          lambda db: _process_shifter_ctx_p(db, CTX_P_COLUMNS, CTX_P_SHIFTS, store=False),
+          columns=CTX_P_COLUMNS, shifts=CTX_P_SHIFTS),
+    Stage('column_preddist', 'context', ('P', 'PRED'), ('PRED_DIST',),
+          lambda db, key: _process_predicate_dist(db, key=key)),
+    Stage('column_passivevoice', 'context', ('P', 'PRED', 'GPOS', 'LEMMA'), ('PASSIVE_VOICE',),
+          lambda db, key: _process_passivevoice(db, key=key)),
+    Stage('column_predmorph', 'context', ('MORF',), ('PRED_MORPH',),
+          lambda db, key: _process_predmorph(db, key=key)),
+    Stage('column_predmarker', 'context', ('P', 'PRED'), ('PRED_MARKER',),
+          lambda db, key: _process_predicate_marker(db, key=key)),
+    Stage('column_deptree', 'dtree', _DTREE_REQUIRES,
+          ['{:}_{:}'.format(c, k) for c in DTREE_COLUMNS
+           for k in ('PARENT', 'GRAND_PARENT', 'CHILD_1', 'CHILD_2', 'CHILD_3')] +
+          ['GPOS_[0-9][0-9]', 'FUNC_[0-9][0-9]'],
+          lambda db, key: _process_dtree(db, DTREE_COLUMNS, key=key),
+          lambda db: _process_dtree(db, DTREE_COLUMNS, store=False),
+          columns=DTREE_COLUMNS),
+    Stage('column_shifter', 'windows', ('P',) + SHIFTER_COLUMNS,
+          ['{:}{:+d}'.format(c, d) for c in SHIFTER_COLUMNS for d in SHIFTER_SHIFTS],
+          lambda db, key: _process_shifter(db, SHIFTER_COLUMNS, SHIFTER_SHIFTS, key=key),
+          lambda db: _process_shifter(db, SHIFTER_COLUMNS, SHIFTER_SHIFTS, store=False),
+          columns=SHIFTER_COLUMNS, shifts=SHIFTER_SHIFTS),
+)
+
+
+def select_stages(groups=None, columns=None, pipeline=PIPELINE):
     '''
-        Builds dtree attributes
-        for golden standard columns ('FUNC', 'GPOS', 'LEMMA', 'FORM')
-        (BELTRAO, 2016) pg 50
+        Stages producing the selected feature sets or columns plus the stages
+        they depend on, in pipeline order; stages whose outputs are not
+        consumed are left out
 
         args:
-            db          .: dict<str, dict<int, ?>>
-                            outer_keys  .: str columns which should contain all base conll attributes
+            groups      .: iterable<str> feature sets e.g ('context', 'windows')
 
-                            inner_keys  .: int token index
-                            ?           .: either text or numerical value
+            columns     .: iterable<str> columns consumed e.g by the svm
 
-            refresh    .: boolean if true recompute attributes and store
+        returns:
+            stages      .: list<Stage>
+    '''
+    groups = set(groups or ())
+    columns = list(columns or ())
+    selected = set(i for i, stage in enumerate(pipeline)
+                   if stage.group in groups or any(stage.provides(c) for c in columns))
+    pending = list(selected)
+    while pending:
+        for column in pipeline[pending.pop()].requires:
+            for j, stage in enumerate(pipeline):
+                if stage.provides(column) and j not in selected:
+                    selected.add(j)
+                    pending.append(j)
+    return [stage for i, stage in enumerate(pipeline) if i in selected]
+
+
+def _levels(db, stages):
+    '''
+        Groups stages so that each one comes after the stages producing
+        the columns it requires, stages of a level are independent
+
+        raises:
+            ValueError  .: a required column is neither in db nor produced
+    '''
+    level = {}
+    for stage in stages:
+        depth = 0
+        for column in stage.requires:
+            producers = [other for other in stages if other is not stage and other.provides(column)]
+            if not producers:
+                if column not in db:
+                    raise ValueError('{:} requires {:} which no stage produces'.format(stage.family, column))
+                continue
+            for other in producers:
+                if other.family not in level:
+                    raise ValueError('{:} must come after {:}'.format(stage.family, other.family))
+                depth = max(depth, level[other.family] + 1)
+        level[stage.family] = depth
+
+    levels = defaultdict(list)
+    for stage in stages:
+        levels[level[stage.family]].append(stage)
+    return [levels[d] for d in sorted(levels)]
+
+
+def _run_stages(db, stages, refresh, jobs=1, update=False):
+    '''
+        Runs stages level by level, with jobs > 1 the stale families of a
+        level are built on a process pool
+
+        args:
+            update      .: bool merges every stage's columns into db so the next
+                            levels read them, otherwise into a new block
 
         returns:
-            dtree    .: dict<int, dict<int, ?>>
-                            outer_keys  .: str columns representing the new dtree features
-                            inner_keys  .: int token index
-                            ?           .: either text or numerical value
+            block       .: TokenTable stages' columns in pipeline order
     '''
-    columns = ('FUNC', 'GPOS', 'LEMMA', 'FORM')
-    if refresh:
-        dtree = _process_dtree(db, columns, store=True)
+    block = db.derive()
+    for level in _levels(db, stages):
+        keys = [stage.key(db) for stage in level]
+        if jobs > 1 and _build_parallel(db, list(zip(level, keys)), refresh, jobs):
+            stale = False
+        else:
+            stale = refresh
+        for stage, key in zip(level, keys):
+            table = stage.run(db, key, stale)
+            block.update(table)
+            if update:
+                db.update(table)
+    return block
 
-    else:
-        dtree = _load_dtree(columns)
 
-    return dtree
+def _build_parallel(db, plan, refresh, jobs):
+    '''
+        Computes and stores the stale families of plan on a process pool:
+        families run concurrently and the ones having compute (shifters and
+        dependency tree) are split into proposition ranges merged back in
+        order, stored columns are the same as the serial build's
 
+        args:
+            plan        .: list<tuple<Stage, str>> stages and cache keys
 
-def _process_dtree(db, columns, store=True):
+        returns:
+            built       .: bool False when there was nothing to build in parallel
+    '''
+    stale = [(stage, key) for stage, key in plan if _stale(stage.family, key, refresh)]
+    if not stale or 'fork' not in multiprocessing.get_all_start_methods():
+        return False
+
+    _propositions(db)
+    shards = _shards(db, jobs)
+    units = []
+    for i, (stage, _) in enumerate(stale):
+        if stage.compute is None:
+            units.append((i, None, None))
+        else:
+            units.extend((i, lb, ub) for lb, ub in shards)
+    if len(units) < 2:
+        return False
 
-    dtree = FeatureFactory().make('ColumnDepTreeParser', db)
-    target_dir = 'datasets_1.1/csvs/column_deptree/'
-    dtree_features = dtree.define(columns).run()
+    # workers are forked after _build is set and read it copy-on-write
+    _build.update(db=db, plan=stale)
+    try:
+        pool = multiprocessing.get_context('fork').Pool(min(jobs, len(units)))
+        with pool:
+            outputs = pool.starmap(_build_unit, units)
+    finally:
+        _build.clear()
 
-    if store:
-        _store_columns(dtree_features, columns, target_dir)
+    parts = defaultdict(list)
+    for (i, _, _), output in zip(units, outputs):
+        parts[i].append(output)
+    for i, (stage, key) in enumerate(stale):
+        if stage.compute is not None:
+            feature_cache.store(_merge(db, parts[i]), stage.family, key)
+    return True
 
-    return dtree_features
 
+# state shared with forked feature workers
+_build = {}
+
+
+def _build_unit(i, lb, ub):
+    '''
+        Builds and stores the i-th stale family (lb is None) or computes its
+        columns over the tokens lb:ub
+
+        returns:
+            size        .: int number of tokens, None for a whole family
+
+            columns     .: OrderedDict<str, tuple<str, np.ndarray>> domain and
+                            values of the shard's columns
+    '''
+    stage, key = _build['plan'][i]
+    db = _build['db'].select(stage.requires)
+    if lb is None:
+        stage.build(db, key)
+        return None, None
+    table = stage.compute(db.take(lb, ub))
+    return table.size, OrderedDict((column, (table.domain(column), table.array(column)))
+                                   for column in table.keys())
 
-def _load_dtree(columns):
-    target_dir = 'datasets_1.1/csvs/column_deptree/'
-    deptree = defaultdict(dict)
-    for col in columns:
-        target_path = '{:}{:}.csv'.format(target_dir, col.lower())
-        _df = pd.read_csv(target_path, encoding='utf-8', index_col=0)
-        deptree.update(_df.to_dict())
-    return deptree
 
-def _store_columns(columns_dict, columns, target_dir):
-    for col in columns:
-        d = {new_col: columns_dict[new_col]
-             for new_col in columns_dict if col in new_col}
+def _shards(db, n):
+    '''
+        Splits the tokens into at most n ranges of whole propositions
+        holding about the same number of tokens
 
-        df = pd.DataFrame.from_dict(d)
-        filename = '{:}{:}.csv'.format(target_dir, col.lower())
-        df.to_csv(filename, sep=',', encoding='utf-8')
-    return columns_dict
+        returns:
+            shards      .: list<tuple<int, int>> lb, ub
+    '''
+    starts = _propositions(db).start
+    cuts = np.searchsorted(starts, np.linspace(0, db.size, n + 1)[1:-1])
+    bounds = np.unique(np.concatenate(([0], starts[np.minimum(cuts, len(starts) - 1)], [db.size])))
+    return [(int(lb), int(ub)) for lb, ub in zip(bounds[:-1], bounds[1:]) if lb < ub]
 
 
-def _store(d, target_name, target_dir):
-        df = pd.DataFrame.from_dict(d)
-        filename = '{:}{:}.csv'.format(target_dir, target_name)
-        df.to_csv(filename, sep=',', encoding='utf-8', index=True)
+def _merge(db, parts):
+    '''
+        Concatenates the columns of consecutive shards in token order, a
+        data dependent column absent from a shard e.g a longer GPOS_NN path
+        is MISSING there as in the whole build
 
+        args:
+            parts       .: list<tuple<int, OrderedDict>> from _build_unit
 
-def _process_conll():
+        returns:
+            table       .: TokenTable
+    '''
+    domains = OrderedDict()
+    for _, columns in parts:
+        for column, (domain, _) in columns.items():
+            domains.setdefault(column, domain)
+
+    table = db.derive()
+    for column, domain in domains.items():
+        fill = np.nan if domain is None else MISSING
+        values = np.concatenate([columns[column][1] if column in columns else np.full(size, fill)
+                                 for size, columns in parts])
+        if domain is None:
+            table.set_array(column, values)
+        else:
+            table.set_codes(column, values, domain)
+    return table
+
+
+def _stale(family, key, refresh):
+    return refresh or not feature_cache.exists(family, key)
+
+
+def _process_conll(refresh=False):
+    '''
+        Conll datasets as a TokenTable, compiled once into a memory mapped
+        corpus under the cache and reopened while the sources are unchanged
+
+        args:
+            refresh     .: boolean if true recompiles the corpus
+    '''
     datasets = ('wTreino.conll', 'wValidacao.conll', 'Teste.conll')
     columns = ('ID', 'FORM', 'LEMMA', 'GPOS', 'MORF', 'DTREE', 'FUNC', 'CTREE', 'PRED', 'HEAD')
-    lexicons = defaultdict(dict)
-    db = defaultdict(dict)
+    sources = OrderedDict()
+    for dataset in datasets:
+        dataset_path = 'datasets_1.1/conll/{:}'.format(dataset)
+        sources[dataset] = feature_cache.file_digest(dataset_path)
+
+    key = feature_cache.sources_key(sources, feature_cache.CORPUS, columns=columns)
+    if _stale(feature_cache.CORPUS, key, refresh):
+        db = _compile_conll(datasets, columns, sources)
+        feature_cache.store_corpus(db, key)
+    db = feature_cache.load_corpus(key)
+    db.propositions = PropositionIndex.build(db)
+    return db, db.lexicons, columns, db.ind
+
+
+def _compile_conll(datasets, columns, sources):
+    reader = ConllReader(columns)
+    blocks = []
+    propositions = []
     ind = defaultdict(dict)
     i = 0
     p = 1  # predicate
     for dataset in datasets:
         dataset_path = 'datasets_1.1/conll/{:}'.format(dataset)
         ind[dataset]['start'] = i
-        with open(dataset_path, mode='r') as f:
-            for line in f.readlines():
-                values = re.sub('\n', '', line).split('\t')
-                if len(values) == len(columns):
-                    for c, column in enumerate(columns):
-                        value = values[c].strip()
-                        if value not in lexicons[column]:
-                            l = len(lexicons[column])
-                            lexicons[column][value] = l
-                        else:
-                            l = lexicons[column][value]
-
-                        db[column][i] = value
-
-                    db['P'][i] = p
-                    i += 1
-                else:
-                    p += 1
+        for skipped, codes in reader.blocks(dataset_path):
+            p += skipped
+            blocks.append(codes)
+            propositions.append(np.full(len(codes), p, dtype=np.int32))
+            i += len(codes)
 
         ind[dataset]['finish'] = i
 
-    return db, lexicons, columns, ind
+    codes = np.concatenate(blocks) if blocks else np.zeros((0, len(columns)), dtype=np.int32)
+    db = TokenTable(i, reader.lexicons, ind, sources)
+    for c, column in enumerate(columns):
+        db.set_codes(column, np.ascontiguousarray(codes[:, c]), column)
+    db.set_array('P', np.concatenate(propositions))
+    return db
 
 
-def process(context=False, dtree=False, windows=True, refresh=True):
+def process(context=False, dtree=False, windows=True, refresh=False, jobs=1, features=None):
     '''
         Processes all engineered features
+
+        args:
+            refresh     .: boolean if true recompute every feature family
+                            otherwise reuse the cached families whose key
+                            (conll sources + parameters) still matches
+
+            jobs        .: int worker processes building the stale families
+                            concurrently, shifters and dependency tree split
+                            into proposition ranges, the stored columns are
+                            the same as with jobs=1
+
+            features    .: list<str> columns consumed besides the selected
+                            feature sets, pulls in the stages producing them
     '''
-    db, lexicons, columns, ind = _process_conll()
+    db, lexicons, columns, ind = _process_conll(refresh)
+
+    stages = select_stages(_groups(context, dtree, windows), features)
+    unknown = [column for column in features or ()
+               if column not in db and not any(stage.provides(column) for stage in stages)]
+    if unknown:
+        raise ValueError('No stage produces {:}'.format(unknown))
+    _run_stages(db, stages, refresh, jobs, update=True)
+
+    return db, lexicons, columns, ind
 
-    # Making tokens around predicate available
-    if context:
-        contexts = get_ctx_p(db, refresh)
-        db.update(contexts)
 
-    # Dtree parsing
-    if dtree:
-        deptree = get_dtree(db, refresh)
-        db.update(deptree)
+def consumed_columns(db, context=False, dtree=False, windows=True, features=None,
+                     pipeline=PIPELINE):
+    '''
+        Columns of db a model consumes: the conll columns, every column of
+        the selected feature sets and the requested features; columns of
+        stages pulled in only by features e.g FORM-1 next to FORM+1 are left out
 
-    # Making column moving windpw around column
-    # Set of featured attributes
-    if windows:
-        windows = get_shifter(db, refresh)
-        db.update(windows)
+        args:
+            db          .: TokenTable from process
 
-    return db, lexicons, columns, ind
\ No newline at end of file
+            features    .: list<str> columns consumed besides the feature sets
+
+        returns:
+            columns     .: list<str> in db order
+    '''
+    groups = _groups(context, dtree, windows)
+    stages = [stage for stage in pipeline if stage.group in groups]
+    features = set(features or ())
+    return [column for column in db.keys()
+            if column in features or
+            not any(stage.provides(column) for stage in pipeline) or
+            any(stage.provides(column) for stage in stages)]
+
+
+def _groups(context, dtree, windows):
+    # context: tokens around predicate, dtree: dependency tree parsing,
+    # windows: columns moving window around the token
+    return [group for group, selected in (('context', context), ('dtree', dtree),
+                                          ('windows', windows)) if selected]
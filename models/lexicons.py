@@ -0,0 +1,160 @@
+'''
+    @author: Varela
+
+    Frozen lexicons
+    * Built from the training split only, unseen tokens map to UNK_ID
+    * Stored as versioned artifacts: one token per line per column plus a header
+    * Feature dimensions no longer depend on wValidacao or Teste and new
+      documents are encoded with dict lookups, no corpus reprocessing
+    * Flags of packed columns (e.g PRED_MORPH) are frozen from the split's
+      multivalued column as well, unseen flags map to UNK_ID
+'''
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import models.feature_cache as feature_cache
+
+LEXICONS_DIR = 'datasets_1.1/lexicons/'
+HEADER = 'header.json'
+UNK = '<UNK>'
+UNK_ID = 0
+TRAIN = 'wTreino.conll'
+# packed flag columns -> multivalued conll column and separator they are split from
+FLAGS = {'PRED_MORPH': ('MORF', '|')}
+
+
+class FrozenLexicon(dict):
+    '''
+        token -> id, unseen tokens are UNK_ID
+    '''
+    def __missing__(self, token):
+        return UNK_ID
+
+
+class FrozenLexicons(object):
+    '''
+        Lexicons of the training split with an explicit unknown token
+
+        Usage:
+            lexicons = FrozenLexicons.freeze(db)          # builds or loads the artifact
+            inputs, outputs, bounds, columns = to_svm(db, lexicons, conllcols)
+
+            lexicons = FrozenLexicons.load('datasets_1.1/lexicons/<key>/')
+            lexicons.encode('FORM', ['casa', 'xyzzy'])     # [id, UNK_ID]
+    '''
+    def __init__(self, tokens, dataset=TRAIN, source=None):
+        '''
+            args:
+                tokens      .: dict<str, list<str>> column -> tokens in id order
+                                UNK first
+
+                dataset     .: str split the tokens come from
+
+                source      .: str digest of the split's conll file
+        '''
+        self.tokens = tokens
+        self.dataset = dataset
+        self.source = source
+        self._lexicons = {column: FrozenLexicon(zip(values, range(len(values))))
+                          for column, values in tokens.items()}
+        digest = hashlib.sha1()
+        for column in sorted(tokens):
+            digest.update('{:}\n{:}\n'.format(column, '\n'.join(tokens[column])).encode('utf-8'))
+        self.version = digest.hexdigest()[:16]
+
+    @classmethod
+    def fit(cls, db, columns, dataset=TRAIN):
+        '''
+            Tokens of columns appearing in dataset's rows, kept in the
+            order of db's lexicon ids, plus the sorted flags of FLAGS columns
+            whose multivalued column is in columns
+
+            args:
+                db          .: TokenTable conll db
+
+                columns     .: tuple<str> categorical conll columns
+        '''
+        start, finish = db.ind[dataset]['start'], db.ind[dataset]['finish']
+        tokens = {}
+        for column in columns:
+            codes = np.asarray(db.codes(column))[start:finish]
+            ids = np.unique(codes[codes >= 0])
+            tokens[column] = [UNK] + db.inverse(db.domain(column))[ids].tolist()
+        for flags, (column, sep) in FLAGS.items():
+            if column in tokens:
+                values = set(flag for token in tokens[column][1:] for flag in token.split(sep))
+                tokens[flags] = [UNK] + sorted(values)
+        return cls(tokens, dataset, db.sources.get(dataset, None))
+
+    @classmethod
+    def freeze(cls, db, columns=None, dataset=TRAIN, lexicons_dir=LEXICONS_DIR):
+        '''
+            Loads the artifact built from dataset's current contents, fits
+            and stores it when missing
+
+            args:
+                db          .: TokenTable conll db
+
+                columns     .: tuple<str> defaults to every conll lexicon
+        '''
+        columns = tuple(sorted(db.lexicons)) if columns is None else tuple(columns)
+        sources = {dataset: db.sources[dataset]}
+        key = feature_cache.sources_key(sources, 'lexicons', columns=columns, flags=FLAGS)
+        target_dir = '{:}{:}/'.format(lexicons_dir, key)
+        if os.path.isfile(target_dir + HEADER):
+            return cls.load(target_dir)
+        lexicons = cls.fit(db, columns, dataset)
+        lexicons.store(target_dir)
+        return lexicons
+
+    @classmethod
+    def load(cls, target_dir):
+        with open(target_dir + HEADER, mode='r', encoding='utf-8') as f:
+            header = json.load(f)
+        tokens = {}
+        for column in header['columns']:
+            with open('{:}{:}.txt'.format(target_dir, column), mode='r', encoding='utf-8') as f:
+                tokens[column] = f.read().split('\n')
+        lexicons = cls(tokens, header['dataset'], header['source'])
+        if lexicons.version != header['version']:
+            raise IOError('{:} does not match its version {:}'.format(target_dir, header['version']))
+        return lexicons
+
+    def store(self, target_dir):
+        staging = feature_cache.staging_dir(target_dir)
+        for column, values in self.tokens.items():
+            with open('{:}{:}.txt'.format(staging, column), mode='w', encoding='utf-8') as f:
+                f.write('\n'.join(values))
+        header = {'version': self.version, 'dataset': self.dataset, 'source': self.source,
+                  'unk': UNK, 'unk_id': UNK_ID, 'columns': sorted(self.tokens)}
+        with open(staging + HEADER, mode='w', encoding='utf-8') as f:
+            json.dump(header, f, ensure_ascii=False, indent=1)
+        return feature_cache.publish(staging, target_dir)
+
+    def encode(self, column, tokens):
+        '''
+            Ids of tokens, unseen ones are UNK_ID
+
+            returns:
+                ids         .: np.ndarray<int32>
+        '''
+        lexicon = self._lexicons[column]
+        return np.array([lexicon[token] for token in tokens], dtype=np.int32)
+
+    def __getitem__(self, column):
+        return self._lexicons[column]
+
+    def __contains__(self, column):
+        return column in self._lexicons
+
+    def __len__(self):
+        return len(self._lexicons)
+
+    def keys(self):
+        return self._lexicons.keys()
+
+    def items(self):
+        return self._lexicons.items()
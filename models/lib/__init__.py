@@ -1 +1 @@
-from .liblinearutil import svm_read_problem, train, predict
\ No newline at end of file
+from .liblinearutil import svm_read_problem, train, predict, predict_batch, evaluations, problem, parameter, L2R_LR, L2R_L2LOSS_SVC, MCSVM_CS
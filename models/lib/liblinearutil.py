@@ -5,15 +5,15 @@ sys.path = [os.path.dirname(os.path.abspath(__file__))] + sys.path
 
 from liblinear import *
 from liblinear import __all__ as liblinear_all
-from liblinear import scipy, sparse
-from ctypes import c_double
+from liblinear import np, scipy, sparse
+from ctypes import c_double, c_uint64, cast, POINTER, sizeof
 
 if sys.version_info[0] < 3:
 	range = xrange
 	from itertools import izip as zip
 
 __all__ = ['svm_read_problem', 'load_model', 'save_model', 'evaluations',
-           'train', 'predict'] + liblinear_all
+           'train', 'predict', 'predict_batch'] + liblinear_all
 
 
 def svm_read_problem(data_file_name, return_scipy=False):
@@ -52,10 +52,10 @@ def svm_read_problem(data_file_name, return_scipy=False):
 					xi[int(ind)] = float(val)
 			prob_x += [xi]
 	if scipy != None and return_scipy:
-		prob_y = scipy.array(prob_y)
-		prob_x = scipy.array(prob_x)
-		col_idx = scipy.array(col_idx)
-		row_ptr = scipy.array(row_ptr)
+		prob_y = np.array(prob_y)
+		prob_x = np.array(prob_x)
+		col_idx = np.array(col_idx)
+		row_ptr = np.array(row_ptr)
 		prob_x = sparse.csr_matrix((prob_x, col_idx, row_ptr))
 	return (prob_y, prob_x)
 
@@ -88,7 +88,7 @@ def evaluations_scipy(ty, pv):
 	Calculate accuracy, mean squared error and squared correlation coefficient
 	using the true values (ty) and predicted values (pv).
 	"""
-	if not (scipy != None and isinstance(ty, scipy.ndarray) and isinstance(pv, scipy.ndarray)):
+	if not (scipy != None and isinstance(ty, np.ndarray) and isinstance(pv, np.ndarray)):
 		raise TypeError("type of ty and pv must be ndarray")
 	if len(ty) != len(pv):
 		raise ValueError("len(ty) must be equal to len(pv)")
@@ -100,7 +100,7 @@ def evaluations_scipy(ty, pv):
 	sumvy = (pv*ty).sum()
 	sumvv = (pv*pv).sum()
 	sumyy = (ty*ty).sum()
-	with scipy.errstate(all = 'raise'):
+	with np.errstate(all = 'raise'):
 		try:
 			SCC = ((l*sumvy-sumv*sumy)*(l*sumvy-sumv*sumy))/((l*sumvv-sumv*sumv)*(l*sumyy-sumy*sumy))
 		except:
@@ -117,7 +117,7 @@ def evaluations(ty, pv, useScipy = True):
 	using the true values (ty) and predicted values (pv).
 	"""
 	if scipy != None and useScipy:
-		return evaluations_scipy(scipy.asarray(ty), scipy.asarray(pv))
+		return evaluations_scipy(np.asarray(ty), np.asarray(pv))
 	if len(ty) != len(pv):
 		raise ValueError("len(ty) must be equal to len(pv)")
 	total_correct = total_error = 0
@@ -197,8 +197,8 @@ def train(arg1, arg2=None, arg3=None):
 		-q : quiet mode (no outputs)
 	"""
 	prob, param = None, None
-	if isinstance(arg1, (list, tuple)) or (scipy and isinstance(arg1, scipy.ndarray)):
-		assert isinstance(arg2, (list, tuple)) or (scipy and isinstance(arg2, (scipy.ndarray, sparse.spmatrix)))
+	if isinstance(arg1, (list, tuple)) or (scipy and isinstance(arg1, np.ndarray)):
+		assert isinstance(arg2, (list, tuple)) or (scipy and isinstance(arg2, (np.ndarray, sparse.spmatrix)))
 		y, x, options = arg1, arg2, arg3
 		prob = problem(y, x)
 		param = parameter(options)
@@ -284,14 +284,14 @@ def predict(y, x, m, options=""):
 	def info(s):
 		print(s)
 
-	if scipy and isinstance(x, scipy.ndarray):
-		x = scipy.ascontiguousarray(x) # enforce row-major
+	if scipy and isinstance(x, np.ndarray):
+		x = np.ascontiguousarray(x) # enforce row-major
 	elif sparse and isinstance(x, sparse.spmatrix):
 		x = x.tocsr()
 	elif not isinstance(x, (list, tuple)):
 		raise TypeError("type of x: {0} is not supported!".format(type(x)))
 
-	if (not isinstance(y, (list, tuple))) and (not (scipy and isinstance(y, scipy.ndarray))):
+	if (not isinstance(y, (list, tuple))) and (not (scipy and isinstance(y, np.ndarray))):
 		raise TypeError("type of y: {0} is not supported!".format(type(y)))
 
 	predict_probability = 0
@@ -367,4 +367,99 @@ def predict(y, x, m, options=""):
 	else:
 		info("Accuracy = %g%% (%d/%d) (classification)" % (ACC, int(round(nr_instance*ACC/100)), nr_instance))
 
-	return pred_labels, (ACC, MSE, SCC), pred_values
\ No newline at end of file
+	return pred_labels, (ACC, MSE, SCC), pred_values
+
+def predict_batch(x, m, labels=None, dec_values=None):
+	"""
+	predict_batch(x, m, labels=None, dec_values=None) -> (p_labels, p_vals)
+
+	x: a scipy spmatrix of l instances, column j is feature index j+1.
+	m: a model returned by train or load_model.
+	labels: optional preallocated float64 ndarray of length l.
+	dec_values: optional preallocated C-contiguous float64 ndarray
+	            of shape (l, nr_classifier).
+
+	Predict every row of x in a single pass: decision values are x times
+	the model weights (plus the bias weights) computed with one sparse
+	product straight into dec_values, labels are taken from m.label as
+	liblinear.predict_values does. Labels and decision values are the
+	ones returned by predict. Feature indices above nr_feature are
+	ignored as in predict.
+
+	The return tuple contains
+	p_labels: ndarray of l predicted labels.
+	p_vals: ndarray of l * nr_classifier decision values. nr_classifier
+	        is 1 if k = 2 and solver is not MCSVM_CS, k otherwise.
+	"""
+	if not (sparse and isinstance(x, sparse.spmatrix)):
+		raise TypeError("type of x: {0} is not supported!".format(type(x)))
+	x = x.tocsr()
+
+	nr_instance = x.shape[0]
+	nr_class = m.get_nr_class()
+	nr_feature = m.get_nr_feature()
+	if nr_class == 2 and m.param.solver_type != MCSVM_CS:
+		nr_classifier = 1
+	else:
+		nr_classifier = nr_class
+
+	if labels is None:
+		labels = np.empty(nr_instance, dtype=np.float64)
+	if dec_values is None:
+		dec_values = np.empty((nr_instance, nr_classifier), dtype=np.float64)
+	if labels.shape != (nr_instance,) or labels.dtype != np.float64:
+		raise ValueError("labels must be a float64 ndarray of length {0}".format(nr_instance))
+	if dec_values.shape != (nr_instance, nr_classifier) or dec_values.dtype != np.float64 \
+			or not dec_values.flags['C_CONTIGUOUS']:
+		raise ValueError("dec_values must be a C-contiguous float64 ndarray of shape ({0}, {1})".format(nr_instance, nr_classifier))
+
+	# columns past the model's features are dropped, as predict's feature_max
+	if x.shape[1] > nr_feature:
+		x = x[:, :nr_feature]
+
+	if not m.w:
+		_predict_batch_values(x, m, labels, dec_values)
+		return labels, dec_values
+
+	# liblinear stores w feature by feature: w[(index-1)*nr_classifier + j]
+	w_size = nr_feature + (1 if m.bias >= 0 else 0)
+	w = np.ctypeslib.as_array(m.w, (w_size*nr_classifier,)).reshape(w_size, nr_classifier)
+	dec_values[:] = x @ w[:x.shape[1]]
+	if m.bias >= 0:
+		dec_values += m.bias*w[nr_feature]
+
+	if m.is_regression_model():
+		labels[:] = dec_values[:, 0]
+	elif nr_classifier == 1:
+		labels[:] = np.where(dec_values[:, 0] > 0, m.label[0], m.label[1])
+	else:
+		label = np.array(m.get_labels(), dtype=np.float64)
+		labels[:] = label[np.argmax(dec_values, axis=1)]
+
+	return labels, dec_values
+
+def _predict_batch_values(x, m, labels, dec_values):
+	"""
+	Fallback of predict_batch for models whose weights are not exposed:
+	x is laid out once as a problem buffer and liblinear.predict_values
+	writes decision values straight into dec_values row by row.
+	x must not have columns past m's features, the bias node is written
+	last in every row.
+	"""
+	nr_instance = x.shape[0]
+	nr_classifier = dec_values.shape[1]
+	prob = problem(np.zeros(nr_instance), x)
+	if m.bias >= 0:
+		prob.x_space["index"][prob.rowptr[1:]-2] = m.get_nr_feature()+1
+		prob.x_space["value"][prob.rowptr[1:]-2] = m.bias
+
+	# one pointer per row into dec_values, same trick problem uses for x
+	dec_ptr = (POINTER(c_double) * max(nr_instance, 1))()
+	if nr_instance:
+		base = dec_values.ctypes.data
+		addr = np.ctypeslib.as_array(cast(dec_ptr, POINTER(c_uint64)), (nr_instance,))
+		addr[:] = np.arange(nr_instance, dtype=np.uint64)*(nr_classifier*sizeof(c_double))+base
+
+	predict_values = liblinear.predict_values
+	for i in range(nr_instance):
+		labels[i] = predict_values(m, prob.x[i], dec_ptr[i])
@@ -0,0 +1,94 @@
+'''
+    @author: Varela
+
+    Numpy scorer for trained linear models
+    * Holds the decision functions of a liblinear model as a weight matrix
+    * Scores with a single X @ W product and reproduces liblinear's labels
+    * Does not import models.lib so workers never load liblinear.so.3
+'''
+import numpy as np
+
+
+class LinearScorer(object):
+    '''
+        Linear decision functions exported from a liblinear model
+
+        Usage:
+            scorer = svm.export()
+            scorer.save('experiments/model.npz')
+
+            scorer = LinearScorer.load('experiments/model.npz')
+            labels = scorer.predict(X)
+    '''
+    def __init__(self, W, b, labels, regression=False):
+        '''
+            args:
+                W           .: np.ndarray<float64> features x classifiers
+                                row j is liblinear's feature index j + 1
+
+                b           .: np.ndarray<float64> classifiers bias
+
+                labels      .: np.ndarray<int> liblinear's label order
+
+                regression  .: bool decision values are the predictions
+        '''
+        self.W = np.ascontiguousarray(W, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.labels = np.asarray(labels)
+        self.regression = bool(regression)
+        if self.W.ndim != 2 or self.W.shape[1] != len(self.b):
+            raise ValueError('W must be features x {:} got {:}'.format(len(self.b), self.W.shape))
+
+    @property
+    def nr_feature(self):
+        return self.W.shape[0]
+
+    def decision_function(self, X):
+        '''
+            Decision values, same as liblinear's predict_values
+
+            args:
+                X           .: scipy.sparse matrix or np.ndarray examples x features
+                                features beyond nr_feature are ignored
+
+            returns:
+                values      .: np.ndarray<float64> examples x classifiers
+        '''
+        if X.shape[1] > self.nr_feature:
+            X = X[:, :self.nr_feature]
+        W = self.W[:X.shape[1]]
+        values = X @ W
+        values += self.b
+        return np.asarray(values)
+
+    def predict(self, X):
+        '''
+            Labels, same as liblinear's predict
+
+            args:
+                X           .: scipy.sparse matrix or np.ndarray examples x features
+
+            returns:
+                labels      .: np.ndarray labels or regression values
+        '''
+        values = self.decision_function(X)
+        if self.regression:
+            return values[:, 0]
+        if values.shape[1] == 1:
+            return np.where(values[:, 0] > 0, self.labels[0], self.labels[1])
+        return self.labels[np.argmax(values, axis=1)]
+
+    def save(self, path):
+        np.savez(path, W=self.W, b=self.b, labels=self.labels,
+                 regression=np.array(self.regression))
+
+    @classmethod
+    def load(cls, path):
+        '''
+            Reads a scorer stored with save
+
+            args:
+                path        .: str .npz file
+        '''
+        with np.load(path) as npz:
+            return cls(npz['W'], npz['b'], npz['labels'], bool(npz['regression']))
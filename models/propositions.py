@@ -0,0 +1,131 @@
+'''
+    @author: Varela
+
+    Proposition index
+    * Built once per corpus in a single pass over P, PRED, ID, FORM and DTREE
+    * Holds start, finish, predicate position and sentence id of every proposition as arrays
+    * Feature engines read it instead of rescanning the corpus for predicates and bounds
+'''
+import numpy as np
+
+from models.token_table import MISSING
+
+# columns two propositions of the same sentence share
+SENTENCE_COLUMNS = ('ID', 'FORM', 'DTREE')
+
+
+class PropositionIndex(object):
+    '''
+        Arrays with one entry per proposition, propositions are the runs of
+        equal P and copies of a sentence (one per predicate) share a sentence id
+
+        Usage:
+            index = PropositionIndex.build(db)
+            index.predicate             # predicate position of each proposition
+            lb, ub = index.bounds()     # proposition bounds of each token
+            index.predicate_times()     # predicate position of each token
+    '''
+    def __init__(self, start, finish, predicate, sentence):
+        '''
+            args:
+                start       .: np.ndarray<int> first token of the proposition
+
+                finish      .: np.ndarray<int> one past the last token of the proposition
+
+                predicate   .: np.ndarray<int> last token with PRED != '-'
+                                within the proposition, MISSING if none
+
+                sentence    .: np.ndarray<int> sentence id, ids are numbered
+                                in order of first appearance
+        '''
+        self.start = start
+        self.finish = finish
+        self.predicate = predicate
+        self.sentence = sentence
+
+    @classmethod
+    def build(cls, db):
+        '''
+            args:
+                db          .: TokenTable with P, PRED and SENTENCE_COLUMNS
+
+            returns:
+                index       .: PropositionIndex
+        '''
+        P = np.asarray(db.array('P'))
+        start = np.concatenate(([0], np.flatnonzero(np.diff(P)) + 1)).astype(np.int64)
+        finish = np.append(start[1:], len(P)).astype(np.int64)
+        if not len(P):
+            start = finish = np.zeros(0, dtype=np.int64)
+
+        proposition = np.repeat(np.arange(len(start)), finish - start)
+        is_predicate = db.codes('PRED') != db.lexicons['PRED'].get('-', MISSING)
+        predicates = np.flatnonzero(is_predicate)
+        owners = proposition[predicates]
+        # keeps the last predicate of each proposition
+        last = np.append(owners[1:] != owners[:-1], True) if len(owners) else owners.astype(bool)
+        predicate = np.full(len(start), MISSING, dtype=np.int64)
+        predicate[owners[last]] = predicates[last]
+
+        stacked = np.stack([db.codes(column) for column in SENTENCE_COLUMNS], axis=1)
+        sentences = {}
+        sentence = np.empty(len(start), dtype=np.int64)
+        for k, (lb, ub) in enumerate(zip(start, finish)):
+            sentence[k] = sentences.setdefault(stacked[lb:ub].tobytes(), len(sentences))
+        return cls(start, finish, predicate, sentence)
+
+    def __len__(self):
+        return len(self.start)
+
+    def propositions(self):
+        '''
+            Proposition of every token
+        '''
+        return np.repeat(np.arange(len(self.start)), self.finish - self.start)
+
+    def bounds(self):
+        '''
+            Proposition bounds for every token
+
+            returns:
+                lb          .: np.ndarray<int> first token of the proposition
+                ub          .: np.ndarray<int> one past the last token of the proposition
+        '''
+        lengths = self.finish - self.start
+        return np.repeat(self.start, lengths), np.repeat(self.finish, lengths)
+
+    def predicate_times(self):
+        '''
+            Predicate position for every token
+
+            raises:
+                KeyError    .: propositions without predicate
+        '''
+        if (self.predicate < 0).any():
+            missing = np.flatnonzero(self.predicate < 0)
+            raise KeyError('propositions without predicate starting at {:}'.format(self.start[missing[:10]]))
+        return np.repeat(self.predicate, self.finish - self.start)
+
+    def take(self, lb, ub):
+        '''
+            Index of the propositions within tokens lb:ub, positions are
+            relative to lb and sentence ids are kept
+
+            raises:
+                ValueError  .: lb or ub falls inside a proposition
+        '''
+        i, j = np.searchsorted(self.start, [lb, ub])
+        if (i < len(self) and self.start[i] != lb) or (j > 0 and self.finish[j - 1] != ub):
+            raise ValueError('{:}:{:} does not hold whole propositions'.format(lb, ub))
+        predicate = self.predicate[i:j]
+        predicate = np.where(predicate >= 0, predicate - lb, MISSING)
+        return PropositionIndex(self.start[i:j] - lb, self.finish[i:j] - lb,
+                                predicate, self.sentence[i:j])
+
+    def sentence_starts(self):
+        '''
+            First token of the first proposition of each proposition's sentence
+        '''
+        _, first, sentence = np.unique(self.sentence, return_index=True, return_inverse=True)
+        return self.start[first][sentence]
+
@@ -0,0 +1,274 @@
+'''
+    @author: Varela
+
+    Structured evaluation results
+    * EvaluationResult holds overall and per-role counts and scores of a conll evaluation
+    * ResultsStore appends results as columns under experiments/results/ so
+      sweeps are compared by querying instead of re-running them
+    * Every append writes its own part directory, forked sweep workers never
+      write to the same file
+'''
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from models.conll_scorer import EXCLUDED, precrecf1
+
+RESULTS_DIR = 'experiments/results/'
+HEADER = 'header.json'
+OVERALL = 'Overall'
+# one row per (result, role), Overall included
+COLUMNS = ('run', 'experiment', 'hparams', 'ds_type', 'sentences', 'propositions',
+           'perc_propositions', 'role', 'ok', 'op', 'ms', 'precision', 'recall', 'f1')
+_STRINGS = ('run', 'experiment', 'hparams', 'ds_type', 'role')
+_FLOATS = ('perc_propositions', 'precision', 'recall', 'f1')
+
+
+class EvaluationResult(object):
+    '''
+        Counts and scores of a conll evaluation
+
+        Usage:
+            result = EvaluationResult.from_counts(counts, 'valid', '-s 0 -c 0.0625')
+            result.f1                   # overall
+            result.scores('A0')         # precision, recall, f1
+    '''
+    def __init__(self, sentences, propositions, perc_propositions, overall, roles,
+                 excluded, ds_type=None, hparams=None):
+        '''
+            args:
+                sentences           .: int
+
+                propositions        .: int
+
+                perc_propositions   .: float percentage of perfect propositions
+
+                overall             .: dict<str, int> ok (corr.), op (excess), ms (missed)
+
+                roles               .: dict<str, dict<str, int>> same for each role
+
+                excluded            .: dict<str, dict<str, int>> same for V
+
+                ds_type             .: str train, valid or test
+
+                hparams             .: str e.g liblinear's optargs
+        '''
+        self.sentences = sentences
+        self.propositions = propositions
+        self.perc_propositions = perc_propositions
+        self.overall = dict(overall)
+        self.roles = OrderedDict((role, dict(roles[role])) for role in sorted(roles))
+        self.excluded = OrderedDict((role, dict(excluded[role])) for role in sorted(excluded))
+        self.ds_type = ds_type
+        self.hparams = hparams
+        self.precision, self.recall, self.f1 = self.scores()
+
+    @classmethod
+    def from_counts(cls, counts, ds_type=None, hparams=None):
+        '''
+            Result of ConllScorer's counts
+        '''
+        ntargets = counts['propositions']
+        perc = 100.0 * counts['perfect'] / ntargets if ntargets > 0 else 0.0
+        return cls(counts['sentences'], ntargets, round(perc, 2), counts['overall'],
+                   counts['roles'], counts['excluded'], ds_type, hparams)
+
+    @classmethod
+    def from_report(cls, txt, ds_type=None, hparams=None):
+        '''
+            Parses srlconll-1.1/bin/srl-eval.pl script output text
+
+            example:
+            Number of Sentences    :         326
+            Number of Propositions :         553
+            Percentage of perfect props :   4.70
+                              corr.  excess  missed    prec.    rec.      F1
+            ------------------------------------------------------------
+                     Overall      398    2068     866    16.14   31.49   21.34
+            ----------
+                        A0      124     285     130    30.32   48.82   37.41
+                        A1      202    1312     288    13.34   41.22   20.16
+                    AM-TMP       22      91      68    19.47   24.44   21.67
+            ------------------------------------------------------------
+                         V      457      32      96    93.46   82.64   87.72
+            ------------------------------------------------------------
+        '''
+        lines = txt.split('\n')
+        sentences = int(lines[0].split(':')[-1])
+        propositions = int(lines[1].split(':')[-1])
+        perc = float(lines[2].split(':')[-1])
+        overall, roles, excluded = None, OrderedDict(), OrderedDict()
+        for line in lines[3:]:
+            fields = line.split()
+            if len(fields) != 7 or not fields[1].isdigit():
+                continue
+            c = {'ok': int(fields[1]), 'op': int(fields[2]), 'ms': int(fields[3])}
+            if fields[0] == OVERALL and overall is None:
+                overall = c
+            elif fields[0] in EXCLUDED:
+                excluded[fields[0]] = c
+            else:
+                roles[fields[0]] = c
+        if overall is None:
+            raise ValueError('srl-eval.pl output has no Overall row')
+        return cls(sentences, propositions, perc, overall, roles, excluded, ds_type, hparams)
+
+    def counts(self, role=None):
+        '''
+            ok, op, ms of a role, Overall when role is None
+        '''
+        if role is None or role == OVERALL:
+            return self.overall
+        if role in self.excluded:
+            return self.excluded[role]
+        return self.roles.get(role, {'ok': 0, 'op': 0, 'ms': 0})
+
+    def scores(self, role=None):
+        '''
+            precision, recall and F1 of a role, Overall when role is None
+        '''
+        c = self.counts(role)
+        return precrecf1(c['ok'], c['op'], c['ms'])
+
+    def summary(self):
+        '''
+            Overall figures with the same rounding as srl-eval.pl's report
+
+            returns:
+                summary     .: dict<str, float> perc_propositions, precision, recall and f1
+        '''
+        values = (self.perc_propositions, self.precision, self.recall, self.f1)
+        keys = ('perc_propositions', 'precision', 'recall', 'f1')
+        return {key: float('{:0.2f}'.format(value)) for key, value in zip(keys, values)}
+
+    def rows(self):
+        '''
+            Overall, then roles and excluded roles
+
+            returns:
+                rows        .: list<tuple<str, dict<str, int>>>
+        '''
+        return [(OVERALL, self.overall)] + list(self.roles.items()) + list(self.excluded.items())
+
+    def to_dict(self):
+        return {
+            'ds_type': self.ds_type,
+            'hparams': self.hparams,
+            'sentences': self.sentences,
+            'propositions': self.propositions,
+            'perc_propositions': self.perc_propositions,
+            'overall': self.overall,
+            'roles': dict(self.roles),
+            'excluded': dict(self.excluded),
+        }
+
+
+class ResultsStore(object):
+    '''
+        Append only columnar store of EvaluationResults, one row per role
+
+        Usage:
+            store = ResultsStore()
+            store.append(result, experiment='context-dtree-window')
+            rows = store.query(ds_type='valid', role='A0')
+            rows['hparams'][np.argmax(rows['f1'])]
+    '''
+    def __init__(self, results_dir=RESULTS_DIR):
+        self.results_dir = results_dir
+        # thread safe part counter, evaluations may append concurrently
+        self._appended = itertools.count()
+
+    def append(self, result, experiment='', run=None):
+        '''
+            Stores a result as a new part
+
+            args:
+                result      .: EvaluationResult
+
+                experiment  .: str e.g experiments' subdirectory
+
+                run         .: str groups results, defaults to the part's name
+
+            returns:
+                part_dir    .: str
+        '''
+        name = '{:}-{:}-{:04d}'.format(time.strftime('%Y%m%d%H%M%S'), os.getpid(), next(self._appended))
+        run = name if run is None else run
+        rows = result.rows()
+        values = {
+            'run': [run] * len(rows),
+            'experiment': [experiment] * len(rows),
+            'hparams': [result.hparams or ''] * len(rows),
+            'ds_type': [result.ds_type or ''] * len(rows),
+            'sentences': [result.sentences] * len(rows),
+            'propositions': [result.propositions] * len(rows),
+            'perc_propositions': [result.perc_propositions] * len(rows),
+            'role': [role for role, _ in rows],
+        }
+        for key in ('ok', 'op', 'ms'):
+            values[key] = [c[key] for _, c in rows]
+        scores = [precrecf1(c['ok'], c['op'], c['ms']) for _, c in rows]
+        for i, key in enumerate(('precision', 'recall', 'f1')):
+            values[key] = [s[i] for s in scores]
+
+        part_dir = '{:}{:}/'.format(self.results_dir, name)
+        os.makedirs(part_dir)
+        for column in COLUMNS:
+            np.save(part_dir + column + '.npy', _column(column, values[column]))
+        # header is written last so a partial part is never loaded
+        with open(part_dir + HEADER, mode='w') as f:
+            json.dump({'rows': len(rows), 'columns': list(COLUMNS)}, f)
+        return part_dir
+
+    def load(self):
+        '''
+            Every stored row
+
+            returns:
+                columns     .: dict<str, np.ndarray> keys in COLUMNS
+        '''
+        parts = []
+        if os.path.isdir(self.results_dir):
+            for name in sorted(os.listdir(self.results_dir)):
+                part_dir = '{:}{:}/'.format(self.results_dir, name)
+                if os.path.isfile(part_dir + HEADER):
+                    parts.append(part_dir)
+        columns = {}
+        for column in COLUMNS:
+            arrays = [np.load(part_dir + column + '.npy') for part_dir in parts]
+            columns[column] = np.concatenate(arrays) if arrays else _column(column, [])
+        return columns
+
+    def query(self, **filters):
+        '''
+            Rows matching every filter
+
+            args:
+                filters     .: column=value or column=list<value>
+                                e.g ds_type='valid', role=['A0', 'A1']
+
+            returns:
+                columns     .: dict<str, np.ndarray> keys in COLUMNS
+        '''
+        columns = self.load()
+        mask = np.ones(len(columns['run']), dtype=bool)
+        for column, value in filters.items():
+            if column not in columns:
+                raise KeyError(column)
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(columns[column], list(value))
+            else:
+                mask &= columns[column] == value
+        return {column: values[mask] for column, values in columns.items()}
+
+
+def _column(column, values):
+    if column in _STRINGS:
+        return np.array(values, dtype=str)
+    if column in _FLOATS:
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=np.int64)
@@ -11,22 +11,55 @@
 import pickle
 import os
 import glob
+import multiprocessing
+import ctypes
+import ctypes.util
 
 import models.lib as _util
-from numpy import isnan
 from collections import defaultdict
 
-from models.feature_factory import process
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from models.feature_factory import consumed_columns, process
 from models.evaluator import Evaluator
+from models.lexicons import FrozenLexicons
+from models.linear_scorer import LinearScorer
+from models.results import ResultsStore
 S = [0, 1, 2, 3, 4, 5, 6, 7]
 C = 0.0625
+# solvers accepting an initial solution: L2R_LR and L2R_L2LOSS_SVC
+WARM_START = (_util.L2R_LR, _util.L2R_L2LOSS_SVC)
+
+
+def svm_srl(cost=C, context=True, dtree=True, solvers=S, window=True, refresh=False, jobs=1,
+            search=False, frozen=False, features=None):
+    '''
+        Trains and evaluates every (solver, cost) pair
+
+        args:
+            cost        .: float or list<float> liblinear's c parameter
+
+            solvers     .: list<int> liblinear's s parameter
+
+            jobs        .: int number of worker processes, stale feature families
+                            are built and pairs are trained in parallel when jobs > 1
 
+            search      .: bool searches cost for every solver instead: costs are
+                            trained in increasing order each warm started from the
+                            previous solution and scored on wValidacao
 
-def svm_srl(cost=C, context=True, dtree=True, solvers=S, window=True, load=False):
+            frozen      .: bool encodes features with FrozenLexicons of wTreino,
+                            tokens unseen in training become UNK_ID
+
+            features    .: list<str> engineered columns e.g PRED_DIST, FORM+1 whose
+                            stages are built besides the context, dtree and window
+                            sets, only the stages producing them run and only the
+                            requested columns of those stages are encoded
+    '''
     # Golden standard columns
     conllcols = ('ID', 'FORM', 'LEMMA', 'GPOS', 'MORF', 'DTREE', 'FUNC', 'CTREE', 'PRED', 'HEAD')
 
-    refresh = not load
     # Solves target directories
     target_dir = 'experiments/'
     if not os.path.isdir(target_dir):
@@ -41,78 +74,194 @@ def svm_srl(cost=C, context=True, dtree=True, solvers=S, window=True, load=False
 
     if window:
         target_dir += 'window' if target_dir[-1] == '/' else '-window'
+
+    if features:
+        target_dir += 'features' if target_dir[-1] == '/' else '-features'
     if not os.path.isdir(target_dir):
             os.mkdir(target_dir)
 
-    db, lexicons, columns, ind = process(context, dtree, window, refresh=refresh)
+    db, lexicons, columns, ind = process(context, dtree, window, refresh=refresh, jobs=jobs,
+                                         features=features)
 
-    evaluator = Evaluator(db, lexicons, columns, ind, target_dir)
-    inputs, outputs, bounds, feature_columns = to_svm(db, lexicons, conllcols)
+    evaluator = Evaluator(db, lexicons, columns, ind, target_dir, results=ResultsStore())
+    feature_lexicons = FrozenLexicons.freeze(db, conllcols) if frozen else lexicons
+    selected = consumed_columns(db, context, dtree, window, features)
+    inputs, outputs, bounds, feature_columns = to_svm(db, feature_lexicons, conllcols, selected)
 
 
     # DEFINE Xtrain, Ytrain
     start = ind['wTreino.conll']['start']
     finish = ind['wTreino.conll']['finish']
-    trainrng = range(start, finish)
-    Xtrain = [inputs[idx] for idx in trainrng]
-    Ytrain = [outputs[idx] for idx in trainrng]
+    Xtrain = inputs[start:finish]
+    Ytrain = outputs[start:finish]
 
     # DEFINE Xvalid, Yvalid
     start = ind['wValidacao.conll']['start']
     finish = ind['wValidacao.conll']['finish']
-    validrng = range(start, finish)
-    Xvalid = [inputs[idx] for idx in validrng]
-    Yvalid = [outputs[idx] for idx in validrng]
+    Xvalid = inputs[start:finish]
+    Yvalid = outputs[start:finish]
+
+    costs = list(cost) if isinstance(cost, (list, tuple)) else [cost]
+    if search:
+        task = _search_task
+        grid = [(s, sorted(costs)) for s in solvers]
+    else:
+        task = _sweep_task
+        grid = [(s, c) for c in costs for s in solvers]
+
+    # the training problem is built once, workers are forked after _sweep
+    # is set and read it copy-on-write
+    problem = SVM().prepare(Xtrain, Ytrain)
+    _sweep.update(evaluator=evaluator, problem=problem, Xtrain=Xtrain, Ytrain=Ytrain,
+                  Xvalid=Xvalid, Yvalid=Yvalid)
+    try:
+        if jobs > 1 and len(grid) > 1 and \
+                'fork' in multiprocessing.get_all_start_methods():
+            pool = multiprocessing.get_context('fork').Pool(min(jobs, len(grid)))
+            with pool:
+                results = pool.starmap(task, grid)
+        elif search:
+            results = [task(*args) for args in grid]
+        else:
+            results = [_resolve(result) for result in [task(*args, wait=False) for args in grid]]
+    finally:
+        _sweep.clear()
+        evaluator.shutdown()
+
+    if search:
+        for result in results:
+            print('-s {:}\tbest C {:0.4f}\tvalid F1 {:0.2f}'.format(
+                result['solver'], result['cost'], result['valid']['f1']))
+    else:
+        for result in results:
+            print('{:}\ttrain F1 {:0.2f}\tvalid F1 {:0.2f}'.format(
+                result['optargs'], result['train']['f1'], result['valid']['f1']))
+    return results
+
+
+# state shared with forked sweep workers
+_sweep = {}
+
+
+def _sweep_task(solver, cost, wait=True):
+    '''
+        Trains one (solver, cost) pair and evaluates train and valid sets
+        reads the data from _sweep
+
+        args:
+            wait        .: bool when False scores are left as futures so the
+                            evaluations overlap the next pair's training
+
+        returns:
+            result      .: dict<str, ?> optargs and conll scores per set
+    '''
+    evaluator = _sweep['evaluator']
+    Xtrain, Ytrain = _sweep['Xtrain'], _sweep['Ytrain']
+    Xvalid, Yvalid = _sweep['Xvalid'], _sweep['Yvalid']
 
     svm = SVM()
-    for s in solvers:
-        optargs = '-s {:} -c {:0.4f}'.format(s, cost)
-        print('Training ... with_optargs({:})'.format(optargs))
-        svm.fit(Xtrain, Ytrain, optargs)
-        print('Training ... done')
+    optargs = '-s {:} -c {:0.4f}'.format(solver, cost)
+    print('Training ... with_optargs({:})'.format(optargs))
+    svm.fit(_sweep['problem'], None, optargs)
+    print('Training ... done')
 
-        keys = ('y_hat', 'acc', 'mse', 'scc')
-        print('Insample prediction ...')
+    result = {'optargs': optargs}
+    print('Insample prediction ...')
 
-        predictions = svm.predict(Xtrain, Ytrain)
-        train_props = predictions['Yhat'].copy()
+    predictions = svm.predict(Xtrain, Ytrain)
+    train_props = predictions['Yhat'].copy()
 
-        evaluator.evaluate(train_props, optargs)
+    # train scoring overlaps the valid prediction
+    result['train'] = evaluator.submit(train_props, optargs)
 
+    print('Insample prediction ... done')
 
-        print('Insample prediction ... done')
 
+    print('Outsample prediction ...')
 
-        print('Outsample prediction ...')
+    predictions = svm.predict(Xvalid, Yvalid, i0=len(train_props))
+    valid_props = predictions['Yhat'].copy()
+    result['valid'] = evaluator.submit(valid_props, optargs)
 
-        predictions = svm.predict(Xvalid, Yvalid, i0=len(train_props))
-        valid_props = predictions['Yhat'].copy()
-        evaluator.evaluate(valid_props, optargs)
+    print('Outsample prediction ... done')
+    return _resolve(result) if wait else result
 
 
-        print('Outsample prediction ... done')
+def _search_task(solver, costs):
+    '''
+        Trains one solver for increasing costs, solvers supporting an initial
+        solution start from the previous cost's weights, every model is scored
+        on wValidacao; reads the data from _sweep
 
-def to_svm(db, lexicons, conll_columns):
+        returns:
+            result      .: dict<str, ?> best cost, its conll scores and
+                            the valid scores of every cost
     '''
-        Converts conll dict into a problem
+    evaluator = _sweep['evaluator']
+    Xvalid, Yvalid = _sweep['Xvalid'], _sweep['Yvalid']
+    i0 = _sweep['Xtrain'].shape[0]
+
+    svm = SVM()
+    init_sol = None
+    result = {'solver': solver, 'cost': None, 'valid': None, 'scores': {}}
+    for cost in costs:
+        optargs = '-s {:} -c {:0.4f}'.format(solver, cost)
+        print('Training ... with_optargs({:})'.format(optargs))
+        svm.fit(_sweep['problem'], None, optargs, init_sol=init_sol)
+        print('Training ... done')
+        if solver in WARM_START:
+            init_sol = svm.solution()
+
+        predictions = svm.predict(Xvalid, Yvalid, i0=i0)
+        # scored while the next cost trains
+        result['scores'][cost] = evaluator.submit(predictions['Yhat'].copy(), optargs)
+
+    for cost in costs:
+        scores = _scores(result['scores'][cost].result())
+        result['scores'][cost] = scores
+        if result['valid'] is None or scores['f1'] > result['valid']['f1']:
+            result['cost'], result['valid'] = cost, scores
+    return result
+
+
+def _scores(result):
+    summary = result.summary()
+    return {'precision': summary['precision'], 'recall': summary['recall'], 'f1': summary['f1']}
+
+
+def _resolve(result):
+    '''
+        Waits for a _sweep_task's evaluations
+    '''
+    for ds_type in ('train', 'valid'):
+        result[ds_type] = _scores(result[ds_type].result())
+    return result
+
+def to_svm(db, lexicons, conll_columns, selected=None):
+    '''
+        Converts the columnar db into a sparse problem
 
         args:
-            db                  .: dict<str,dict<int, ?>> is a dict of dicts representing the conll db +
+            db                  .: TokenTable representing the conll db +
                                     engineered attributes.
-                                    outer_keys: attribute column name
-                                    inner_keys: example index
-                                    inner_values : either a category or a value 
+                                    categorical columns are lexicon ids
+                                    numerical columns are values
+                                    packed columns are one binary feature per bit
 
-            
             lexicons            .: dict<str,dict<str, int>>  is a dict of dicts represering all possible column values
                                     outer_keys: column_name in conll_column
+                                    or FrozenLexicons: dimensions come from the training split
 
             conll_columns       .: tuple with original columns in .conll files
 
-        returns:            
-            inputs dict<int, dict<int,float>>
+            selected            .: list<str> columns to encode e.g from
+                                    consumed_columns, defaults to every column of db
 
-            outputs dict<int, int>
+        returns:
+            inputs scipy.sparse.csr_matrix<float64> examples x features
+                    column j is liblinear's feature index j + 1
+
+            outputs np.ndarray<int32> HEAD lexicon ids
 
             bounds  dict<str, int>
 
@@ -121,6 +270,8 @@ def to_svm(db, lexicons, conll_columns):
     '''
     # returns the dimension of a feature by approximate matching
     def get_dim(searchcol):
+        if db.is_packed(searchcol):
+            return len(_flagids(db, searchcol, lexicons)[1])
         for key in conll_columns:
             if key in searchcol:  # approximate comparison
                 return len(lexicons[key])
@@ -132,50 +283,192 @@ def to_svm(db, lexicons, conll_columns):
                 return key
         return None
 
-
     # normalize the database
     columns = sorted([ col
-        for col in list(db.keys()) if col not in ('HEAD','P')])
+        for col in list(db.keys() if selected is None else selected) if col not in ('HEAD','P')])
 
     bounds = {col: get_dim(col) for col in columns}
 
-    inputs = defaultdict(dict)
-    for idx in db['HEAD']:
-        lb = 1
-        for col in columns:
-            # if col not in ['HEAD', 'P']:
-            if col not in ['HEAD', 'P', 'ID', 'DTREE', 'CTREE']:
-                dim = bounds[col]
-                value = db[col].get(idx, None)
-                try:
-                    if value:    # might be string or non zero numeric value
-                        if isinstance(value, str):   # is a categorical column
-                            lexcol = get_lex(col)
-                            inputs[idx][lb + lexicons[lexcol][db[col][idx]]] = 1.0
-                        elif not isnan(value):
-                             inputs[idx][lb] = float(db[col][idx])
-                except KeyError:
-                    import code; code.interact(local=dict(globals(), **locals()))
-                lb += dim
-
-    outputs = { idx: lexicons['HEAD'][val] for idx, val in db['HEAD'].items()}
+    rows, cols, data = [], [], []
+    lb = 1
+    for col in columns:
+        if col in ('ID', 'DTREE', 'CTREE'):
+            continue
+
+        if db.is_packed(col):
+            bits = np.asarray(db.bits(col))
+            flagids, _ = _flagids(db, col, lexicons)
+            for j in range(bounds[col]):
+                # bits of db's flags sharing feature j e.g every flag unseen in training
+                mask = sum(1 << i for i in np.flatnonzero(flagids == j).tolist())
+                index = np.flatnonzero(bits & bits.dtype.type(mask))
+                rows.append(index)
+                cols.append(np.full(len(index), lb - 1 + j, dtype=np.int64))
+                data.append(np.ones(len(index)))
+        elif db.domain(col) is None:
+            values = np.asarray(db.array(col), dtype=np.float64)
+            index = np.flatnonzero((values != 0) & ~np.isnan(values))
+            rows.append(index)
+            cols.append(np.full(len(index), lb - 1, dtype=np.int64))
+            data.append(values[index])
+        else:
+            lexids = _lexids(db, col, lexicons, get_lex(col))
+            index = np.flatnonzero(lexids >= 0)
+            rows.append(index)
+            cols.append(lb - 1 + lexids[index])
+            data.append(np.ones(len(index)))
+        lb += bounds[col]
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    data = np.concatenate(data) if data else np.zeros(0)
+    inputs = csr_matrix((data, (rows, cols)), shape=(db.size, lb - 1))
+    inputs.sort_indices()
+
+    outputs = np.array(db.codes('HEAD'), dtype=np.int32)
 
     return inputs, outputs, bounds, columns
 
+
+def _weights(m):
+    '''
+        View of a liblinear model's weights, liblinear stores them feature by
+        feature: row j is feature index j + 1 and the last row is the bias'
+        when m.bias >= 0
+
+        returns:
+            w           .: np.ndarray<float64> (nr_feature + bias) x classifiers
+    '''
+    nr_class = m.get_nr_class()
+    if nr_class == 2 and m.param.solver_type != _util.MCSVM_CS:
+        nr_w = 1
+    else:
+        nr_w = nr_class
+    w_size = m.get_nr_feature() + (1 if m.bias >= 0 else 0)
+    return np.ctypeslib.as_array(m.w, (w_size * nr_w,)).reshape(w_size, nr_w)
+
+
+def _flagids(db, col, lexicons):
+    '''
+        Translates the bits of a packed column into ids of lexicons[domain]
+        when lexicons define its flags (FrozenLexicons, unseen flags are
+        UNK_ID) otherwise keeps db's flags
+
+        returns:
+            flagids     .: np.ndarray<int64> feature of every bit
+
+            lexicon     .: dict<str, int> flags the features refer to
+    '''
+    domain = db.domain(col)
+    tokens = db.inverse(domain)
+    if domain in lexicons and lexicons[domain] is not db.lexicon(domain):
+        lexicon = lexicons[domain]
+        return np.array([lexicon[token] for token in tokens], dtype=np.int64), lexicon
+    return np.arange(len(tokens), dtype=np.int64), db.lexicon(domain)
+
+
+def _lexids(db, col, lexicons, lexcol):
+    '''
+        Translates a categorical column's codes into ids of lexicons[lexcol]
+        one lookup per distinct token, empty tokens and missing become -1
+        (unseen tokens are UNK_ID for FrozenLexicons)
+    '''
+    codes = db.codes(col)
+    domain = db.domain(col)
+    tokens = db.inverse(domain)
+    if db.lexicon(domain) is lexicons[lexcol]:
+        translate = np.array([i if token else -1
+                              for i, token in enumerate(tokens)], dtype=np.int64)
+    else:
+        translate = np.array([lexicons[lexcol][token] if token else -1
+                              for token in tokens], dtype=np.int64)
+    lexids = np.full(len(codes), -1, dtype=np.int64)
+    present = codes >= 0
+    lexids[present] = translate[codes[present]]
+    return lexids
+
+
+def _reseed(seed=1):
+    '''
+        liblinear's coordinate descent solvers draw from libc's rand(),
+        reseeding before every fit makes a model independent of the models
+        trained before it in the same process (or pool worker)
+    '''
+    if _libc is not None:
+        _libc.srand(seed)
+
+
+_libc_path = ctypes.util.find_library('c')
+_libc = ctypes.CDLL(_libc_path) if _libc_path else None
+
+
 class SVM(object):
     _svm = None
+    _problem = None
 
     @classmethod
     def read(cls, svmproblem_path):
         Y, X = _util.svm_read_problem(svmproblem_path)
         return Y, X
 
-    def fit(self, X, Y, argstr):
-        self._svm = _util.train(Y, X, argstr)
+    def prepare(self, X, Y):
+        '''
+            Builds liblinear's problem once so that it can be reused by fit
+            across solvers and costs, the problem is kept alive by the instance
+
+            args:
+                X           .: scipy.sparse.csr_matrix examples x features
+
+                Y           .: np.ndarray labels
+
+            returns:
+                problem     .: liblinear problem
+        '''
+        self._problem = _util.problem(Y, X)
+        return self._problem
+
+    def fit(self, X, Y, argstr, init_sol=None):
+        '''
+            Trains a model
+
+            args:
+                X           .: examples or a problem from prepare
+
+                Y           .: labels, ignored when X is a problem
+
+                argstr      .: str liblinear options e.g '-s 1 -c 0.0625'
+
+                init_sol    .: np.ndarray<float64> initial weights from solution
+                                only for solvers in WARM_START
+        '''
+        _reseed()
+        if not isinstance(X, _util.problem):
+            X = _util.problem(Y, X)
+        param = _util.parameter(argstr)
+        if init_sol is not None:
+            if param.solver_type not in WARM_START:
+                raise ValueError('solver {:} does not take an initial solution'.format(param.solver_type))
+            init_sol = np.ascontiguousarray(init_sol, dtype=np.float64)
+            param.init_sol = init_sol.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+        self._svm = _util.train(X, param)
+        # the model keeps a copy of param, init_sol is not owned by it
+        self._svm.param.init_sol = None
+
+    def solution(self):
+        '''
+            Copy of the trained weights in liblinear's layout, the init_sol
+            of a fit on the same problem
+        '''
+        return _weights(self._svm).ravel().copy()
 
     def predict(self, X, Y, i0=0):
         # return pred_labels, (ACC, MSE, SCC), pred_values
-        labels, metrics, values = _util.predict(Y, X, self._svm)
+        if issparse(X):
+            labels, values = _util.predict_batch(X, self._svm)
+            metrics = _util.evaluations(Y, labels)
+            labels = labels.tolist()
+        else:
+            labels, metrics, values = _util.predict(Y, X, self._svm)
         index = range(i0, i0 + len(labels), 1)
         d = {
             'Yhat': dict(zip(index, labels)),
@@ -186,6 +479,22 @@ class SVM(object):
         }
         return d
 
+    def export(self):
+        '''
+            Exports the trained model as a numpy LinearScorer
+
+            returns:
+                scorer      .: LinearScorer
+        '''
+        m = self._svm
+        w = _weights(m)
+        nr_feature = m.get_nr_feature()
+        if m.bias >= 0:
+            b = m.bias * w[nr_feature]
+        else:
+            b = np.zeros(w.shape[1], dtype=np.float64)
+        return LinearScorer(w[:nr_feature].copy(), b, m.get_labels(), m.is_regression_model())
+
     def predict_with_propositions(self, X, Y, P_d):
         d = self.predict(X, Y)
 
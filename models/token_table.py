@@ -0,0 +1,419 @@
+'''
+    @author: Varela
+
+    Columnar token store
+    * Holds conll columns and engineered attributes as contiguous numpy arrays
+    * Categorical columns are integer coded against a lexicon
+    * Multivalued columns are packed as one bitmask per token, bit i is lexicon id i
+    * Exposes dict-of-dicts accessors db[column][idx] for compatibility
+'''
+from collections import OrderedDict, defaultdict
+from numbers import Number
+
+import numpy as np
+
+# Code for a categorical value which is absent
+MISSING = -1
+
+
+class TokenTable(object):
+    '''
+        Columnar table of tokens
+
+        Categorical columns are stored as int32 arrays of lexicon ids where
+        MISSING marks absent values, numerical columns are stored as numeric
+        arrays where nan marks absent values
+
+        Usage:
+            db = TokenTable(size, lexicons, ind)
+            db.set_codes('FORM', codes, 'FORM')
+            db['FORM'][idx]          # dict-style access decodes the token
+            db.codes('FORM')         # vectorized access returns lexicon ids
+    '''
+    def __init__(self, size, lexicons=None, ind=None, sources=None, propositions=None):
+        '''
+            args:
+                size        .: int number of tokens (rows)
+
+                lexicons    .: dict<str, dict<str, int>> shared lexicons
+                                outer_keys: domain name (conll column)
+                                inner_keys: token
+                                inner_values: lexicon id
+
+                ind         .: dict<str, dict<str, int>> per-dataset offsets
+                                outer_keys: dataset name
+                                inner_keys: start, finish
+
+                sources     .: dict<str, str> dataset name -> content digest
+
+                propositions .: PropositionIndex of the P column, None if not built
+        '''
+        self.size = int(size)
+        self.lexicons = defaultdict(dict) if lexicons is None else lexicons
+        self.ind = {} if ind is None else ind
+        self.sources = OrderedDict() if sources is None else sources
+        self.propositions = propositions
+        self._columns = OrderedDict()
+        self._domains = {}
+        self._local = {}
+        self._inverse = {}
+        self._packed = set()
+
+    def derive(self):
+        '''
+            Empty table sharing size, lexicons, offsets and propositions
+            feature engines fill it and the caller merges with db.update
+        '''
+        return TokenTable(self.size, self.lexicons, self.ind, self.sources, self.propositions)
+
+    def set_codes(self, column, codes, domain):
+        '''
+            Stores a categorical column
+
+            args:
+                column      .: str column name
+
+                codes       .: array-like<int> lexicon ids MISSING if absent
+
+                domain      .: str key of the lexicon the ids refer to
+        '''
+        codes = np.asarray(codes, dtype=np.int32)
+        self._check_size(column, codes)
+        self._columns[column] = codes
+        self._domains[column] = domain
+
+    def set_array(self, column, values):
+        '''
+            Stores a numerical column
+
+            args:
+                column      .: str column name
+
+                values      .: array-like<int|float> nan if absent
+        '''
+        values = np.asarray(values)
+        if values.dtype.kind not in 'biuf':
+            raise ValueError('{:} must be numerical got {:}'.format(column, values.dtype))
+        self._check_size(column, values)
+        self._columns[column] = values
+        self._domains[column] = None
+
+    def set_bits(self, column, bits, domain):
+        '''
+            Stores a multivalued column as bitmasks
+
+            args:
+                column      .: str column name
+
+                bits        .: array-like<uint> bit i is set if the token holds
+                                the value whose lexicon id is i
+
+                domain      .: str key of the lexicon the bits refer to
+        '''
+        bits = np.asarray(bits)
+        if bits.dtype.kind != 'u' or len(self.lexicon(domain)) > 8 * bits.dtype.itemsize:
+            raise ValueError('{:} must be unsigned with a bit per {:} token'.format(column, domain))
+        self._check_size(column, bits)
+        self._columns[column] = bits
+        self._domains[column] = domain
+        self._packed.add(column)
+
+    def codes(self, column):
+        '''
+            Lexicon ids of a categorical column
+        '''
+        if self._domains[column] is None:
+            raise ValueError('{:} is numerical'.format(column))
+        if column in self._packed:
+            raise ValueError('{:} is packed'.format(column))
+        return self._columns[column]
+
+    def bits(self, column):
+        '''
+            Bitmasks of a multivalued column
+        '''
+        if column not in self._packed:
+            raise ValueError('{:} is not packed'.format(column))
+        return self._columns[column]
+
+    def is_packed(self, column):
+        return column in self._packed
+
+    def array(self, column):
+        '''
+            Underlying array of a column, either lexicon ids or numbers
+        '''
+        return self._columns[column]
+
+    def domain(self, column):
+        '''
+            Lexicon key of a categorical column, None for numerical columns
+        '''
+        return self._domains[column]
+
+    def lexicon(self, domain):
+        '''
+            Lexicon for domain
+        '''
+        if domain in self._local:
+            return self._local[domain]
+        return self.lexicons[domain]
+
+    def set_lexicon(self, domain, lexicon):
+        '''
+            Registers a lexicon local to this table
+        '''
+        self._local[domain] = lexicon
+
+    def is_local(self, domain):
+        return domain in self._local
+
+    def inverse(self, domain):
+        '''
+            Object array mapping lexicon ids back to tokens
+        '''
+        lexicon = self.lexicon(domain)
+        cached = self._inverse.get(domain, None)
+        if cached is None or len(cached) != len(lexicon):
+            cached = np.empty(len(lexicon), dtype=object)
+            for token, idx in lexicon.items():
+                cached[idx] = token
+            self._inverse[domain] = cached
+        return cached
+
+    def encode(self, domain, tokens):
+        '''
+            Converts tokens into lexicon ids, None becomes MISSING
+
+            args:
+                domain      .: str key of the lexicon
+
+                tokens      .: iterable<str>
+
+            returns:
+                codes       .: np.ndarray<int32>
+        '''
+        lexicon = self.lexicon(domain)
+        codes = [MISSING if token is None else lexicon[token] for token in tokens]
+        return np.array(codes, dtype=np.int32)
+
+    def decode(self, column, index=None):
+        '''
+            Converts a column back into python values
+
+            args:
+                column      .: str column name
+
+                index       .: int or array-like<int> rows, None for all rows
+
+            returns:
+                values      .: list of str, int, float or None
+                                packed columns decode into their bitmasks
+        '''
+        arr = self._columns[column]
+        if index is not None:
+            arr = arr[index]
+        domain = self._domains[column]
+        if domain is None or column in self._packed:
+            if arr.dtype.kind == 'f':
+                return [None if np.isnan(v) else v for v in arr.tolist()]
+            return arr.tolist()
+
+        inverse = self.inverse(domain)
+        missing = arr < 0
+        values = inverse.take(np.where(missing, 0, arr)) if len(inverse) else \
+            np.empty(len(arr), dtype=object)
+        values[missing] = None
+        return values.tolist()
+
+    def update(self, other):
+        '''
+            Merges columns into the table
+
+            args:
+                other       .: TokenTable sharing lexicons or
+                                dict<str, dict<int, ?>> legacy dict of dicts
+        '''
+        if isinstance(other, TokenTable):
+            if other.size != self.size:
+                raise ValueError('size mismatch {:} != {:}'.format(other.size, self.size))
+            for column in other.keys():
+                domain = other._domains[column]
+                if domain in other._local:
+                    self._local[domain] = other._local[domain]
+                self._columns[column] = other._columns[column]
+                self._domains[column] = domain
+                if column in other._packed:
+                    self._packed.add(column)
+                else:
+                    self._packed.discard(column)
+        else:
+            for column, values in other.items():
+                self._set_dict(column, values)
+
+    def select(self, columns):
+        '''
+            Table with a subset of columns, arrays are shared not copied
+        '''
+        table = self.derive()
+        for column in columns:
+            table._columns[column] = self._columns[column]
+            table._domains[column] = self._domains[column]
+            if self._domains[column] in self._local:
+                table._local[self._domains[column]] = self._local[self._domains[column]]
+        table._packed = self._packed & set(columns)
+        return table
+
+    def take(self, lb, ub):
+        '''
+            Table of the rows lb:ub sharing lexicons, arrays are views and
+            row 0 of the new table is row lb; lb:ub must hold whole
+            propositions when the proposition index is built
+        '''
+        propositions = None if self.propositions is None else self.propositions.take(lb, ub)
+        table = TokenTable(ub - lb, self.lexicons, propositions=propositions)
+        for column in self._columns:
+            table._columns[column] = self._columns[column][lb:ub]
+            table._domains[column] = self._domains[column]
+        table._local.update(self._local)
+        table._packed = set(self._packed)
+        return table
+
+    def to_dict(self, columns=None):
+        '''
+            Legacy representation dict<str, OrderedDict<int, ?>>
+        '''
+        columns = self.keys() if columns is None else columns
+        return {col: OrderedDict(zip(range(self.size), self.decode(col)))
+                for col in columns}
+
+    def nbytes(self):
+        return sum(arr.nbytes for arr in self._columns.values())
+
+    # dict-style accessors
+    def keys(self):
+        return list(self._columns.keys())
+
+    def values(self):
+        return [_ColumnView(self, col) for col in self._columns]
+
+    def items(self):
+        return [(col, _ColumnView(self, col)) for col in self._columns]
+
+    def get(self, column, default=None):
+        if column in self._columns:
+            return _ColumnView(self, column)
+        return default
+
+    def __getitem__(self, column):
+        if column not in self._columns:
+            raise KeyError(column)
+        return _ColumnView(self, column)
+
+    def __setitem__(self, column, values):
+        self.update({column: values})
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._columns)
+
+    def _check_size(self, column, arr):
+        if len(arr) != self.size:
+            raise ValueError('{:} has {:} rows expected {:}'.format(column, len(arr), self.size))
+
+    def _set_dict(self, column, d):
+        '''
+            Encodes a legacy dict<int, ?> column, keys are token indexes
+            strings become categorical anything else numerical
+        '''
+        index = np.fromiter(d.keys(), dtype=np.int64, count=len(d))
+        values = list(d.values())
+        is_missing = [v is None or (isinstance(v, float) and np.isnan(v)) for v in values]
+
+        if any(isinstance(v, str) for v in values):
+            tokens = [None if m else str(v) for v, m in zip(values, is_missing)]
+            domain = self._resolve_domain(column, tokens)
+            codes = np.full(self.size, MISSING, dtype=np.int32)
+            codes[index] = self.encode(domain, tokens)
+            self.set_codes(column, codes, domain)
+        else:
+            numbers = [np.nan if m else v for v, m in zip(values, is_missing)]
+            if any(is_missing) or len(index) < self.size or \
+                    not all(isinstance(v, (int, np.integer)) for v in numbers):
+                arr = np.full(self.size, np.nan)
+            else:
+                arr = np.zeros(self.size, dtype=np.int32)
+            if numbers and not all(isinstance(v, Number) for v in numbers):
+                raise ValueError('{:} has unsupported values'.format(column))
+            arr[index] = numbers
+            self.set_array(column, arr)
+
+    def _resolve_domain(self, column, tokens):
+        '''
+            Finds the lexicon for a derived categorical column by approximate
+            matching against the base columns e.g 'FORM+1' -> 'FORM', falls back
+            to a lexicon local to the column
+        '''
+        present = set(token for token in tokens if token is not None)
+        for domain in list(self.lexicons.keys()):
+            if domain in column and present <= set(self.lexicons[domain]):
+                return domain
+
+        lexicon = self._local.setdefault(column, OrderedDict())
+        for token in tokens:
+            if token is not None and token not in lexicon:
+                lexicon[token] = len(lexicon)
+        return column
+
+
+class _ColumnView(object):
+    '''
+        Read-only dict<int, ?> view over a column
+    '''
+    def __init__(self, table, column):
+        self._table = table
+        self._column = column
+
+    def __getitem__(self, idx):
+        if not self._has(idx):
+            raise KeyError(idx)
+        arr = self._table._columns[self._column]
+        domain = self._table._domains[self._column]
+        value = arr[idx]
+        if domain is None or self._table.is_packed(self._column):
+            value = value.item()
+            return None if isinstance(value, float) and np.isnan(value) else value
+        if value < 0:
+            return None
+        return self._table.inverse(domain)[value]
+
+    def get(self, idx, default=None):
+        if self._has(idx):
+            return self[idx]
+        return default
+
+    def keys(self):
+        return range(self._table.size)
+
+    def values(self):
+        return self._table.decode(self._column)
+
+    def items(self):
+        return zip(range(self._table.size), self._table.decode(self._column))
+
+    def __contains__(self, idx):
+        return self._has(idx)
+
+    def __iter__(self):
+        return iter(range(self._table.size))
+
+    def __len__(self):
+        return self._table.size
+
+    def _has(self, idx):
+        return isinstance(idx, (int, np.integer)) and 0 <= idx < self._table.size
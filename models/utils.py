@@ -7,30 +7,90 @@
 '''
 import os
 import re
+from collections import namedtuple
 
-def store(ds_type, db, lexicons, props, hparams, target_dir, stats=None):
+import numpy as np
+
+# Propositions written per bulk write
+PROPS_CHUNK = 1024
+
+# Propositions as arrays: bounds[i]:bounds[i + 1] are the tokens of the i-th
+# proposition, targets its PRED column and vocab[labels] its HEAD tags
+Props = namedtuple('Props', ('bounds', 'targets', 'labels', 'vocab'))
+
+
+def props_arrays(db, lexicons, props):
+    '''
+        Converts predictions into Props
+
+        args:
+            db          .: TokenTable
+
+            lexicons    .: dict<str, dict<str, int>>
+
+            props       .: dict<int, int> keys are the index, values are HEAD ids
+
+        returns:
+            props       .: Props
+    '''
+    index = np.fromiter(props.keys(), dtype=np.int64, count=len(props))
+    labels = np.fromiter((int(y) for y in props.values()), dtype=np.int64, count=len(props))
+    P = np.asarray(db.array('P'))[index]
+    bounds = np.concatenate(([0], np.flatnonzero(P[1:] != P[:-1]) + 1, [len(index)]))
+    vocab = [None] * (max(lexicons['HEAD'].values()) + 1)
+    for token, idx in lexicons['HEAD'].items():
+        vocab[idx] = token
+    return Props(bounds, db.decode('PRED', index), labels, vocab)
+
+
+def write_props(f, props, chunk_size=PROPS_CHUNK):
+    '''
+        Writes propositions in the conll props format, a blank line
+        separates propositions and chunk_size propositions go per write
+
+        args:
+            f           .: file-like open for writing text
+
+            props       .: Props
+    '''
+    tags = np.asarray(props.vocab, dtype=object)[props.labels]
+    lines = ['{:}\t{:}\n'.format(target, tag) for target, tag in zip(props.targets, tags)]
+    bounds = props.bounds
+    for b in bounds[1:-1]:
+        lines[b - 1] += '\n'
+    for k in range(0, len(bounds) - 1, chunk_size):
+        lb, ub = bounds[k], bounds[min(k + chunk_size, len(bounds) - 1)]
+        f.write(''.join(lines[lb:ub]))
+
+
+def store(ds_type, db, lexicons, props, hparams, target_dir, stats=None, stream=None):
     '''
         Stores props and stats into target_dir 
+
+        args:
+            props       .: dict<int, int> keys are the index, values are HEAD ids
+                            or Props from props_arrays
+
+            stream      .: file-like when set props are written to it instead
+                            of target_dir/<ds_type>.props e.g srl-eval.pl's stdin
     '''
     hparams = re.sub(' ', '-', re.sub('-', '', hparams))
     target_dir += '/{:}/'.format(hparams)
-    if not os.path.isdir(target_dir):
-        os.mkdir(target_dir)
-
-    target_path = '{:}/{:}.props'.format(target_dir, ds_type)
+    # train and valid evaluations may run concurrently
+    os.makedirs(target_dir, exist_ok=True)
 
-    head = {idx: token for token, idx in lexicons['HEAD'].items()}
-    p = db['P'][min(props)]
-    with open(target_path, mode='w+') as f:
-        for idx, prop in props.items():
-            if db['P'][idx] != p:
-                f.write('\n')
-                p = db['P'][idx]
-            f.write('{:}\t{:}\n'.format(db['PRED'][idx], head[int(prop)]))
+    if not isinstance(props, Props):
+        props = props_arrays(db, lexicons, props)
+    if stream is None:
+        target_path = '{:}/{:}.props'.format(target_dir, ds_type)
+        with open(target_path, mode='w+', encoding='utf-8') as f:
+            write_props(f, props)
+    else:
+        write_props(stream, props)
 
     if stats:
         target_path = '{:}/{:}.stats.txt'.format(target_dir, ds_type)
-        with open(target_path, mode='w+') as f:
+        with open(target_path, mode='w+', encoding='utf-8') as f:
             for name, value in stats.items():
                 f.write('{:}\t{:}\n'.format(name, value))
 
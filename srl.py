@@ -27,13 +27,33 @@
         dtree -- Dependency tree set of features
         window -- Lead and lag tokens ( moving window ) across token set of features
 
+    > python srl.py -s 0 1 2 3 4 5 6 7 -c 0.0625 0.25 -window -j 4
+        Trains the 16 (solver, cost) pairs on 4 worker processes
+        Results are stored under experiments/ as in a sequential run
+
+    > python srl.py -s 0 2 -search -window
+        Searches C over 2^-6 ... 2^3 for solvers 0 and 2 warm starting
+        each C from the previous solution and reports the best C per solver
+
+    > python srl.py -s 0 -features PRED_DIST PASSIVE_VOICE
+        Uses the conll columns plus the predicate distance and passive voice
+        features, no other feature family is computed
+
+    > python srl.py -s 0 -window -frozen
+        Feature dimensions come from lexicons built on wTreino only and stored
+        under datasets_1.1/lexicons/, tokens unseen in training share an unknown id
+
 '''
 
 import argparse
+import warnings
+
 from models import svm_srl
 
 S = [0, 1, 2, 3, 4, 5, 6, 7]
 C = 0.0625
+# costs searched by -search when -c is not given
+CGRID = [2 ** k for k in range(-6, 4)]
 
 if __name__ == '__main__':
     #Parse descriptors
@@ -56,16 +76,37 @@ if __name__ == '__main__':
                     \t6 -- L1-regularized logistic regression\n
                     \t7 -- L2-regularized logistic regression (dual)\n''')
 
-    parser.add_argument('-c', dest='cost', type=float, nargs=1, default=0.0625,
-                    help=''' Liblinear\'s c parameter:
-                            -c cost : set the parameter C (default 0.0625)''')
+    parser.add_argument('-c', dest='cost', type=float, nargs='+', default=None,
+                    help=''' Liblinear\'s c parameter received as an array of floats:
+                            -c cost : set the parameter C (default 0.0625,
+                            with -search 2^-6 ... 2^3)''')
     parser.add_argument('-context', action='store_true', help='''uses group of feature around predicate''')
     parser.add_argument('-dtree', action='store_true', help='''dependency tree parameters''')
     parser.add_argument('-window', action='store_true', help='''lead and lag set of parameters''')
-    parser.add_argument('-load', action='store_true', help='''loads precomputed features''')
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument('-refresh', action='store_true', help='''recomputes every feature family
+                    (default: reuses cached families whose conll sources and parameters are unchanged)''')
+    cache.add_argument('-load', action='store_true', help='''deprecated: loads precomputed features,
+                    which is now the default, kept as an alias of not passing -refresh''')
+    parser.add_argument('-j', dest='jobs', type=int, default=1,
+                    help='''number of worker processes building stale feature families and
+                    training (solver, cost) pairs in parallel (default 1)''')
+    parser.add_argument('-search', action='store_true', help='''searches the best C for every solver: costs are
+                    warm started from the previous solution (-s 0 and 2) and scored on wValidacao''')
+    parser.add_argument('-features', nargs='+', default=None,
+                    help='''engineered columns to add e.g PRED_DIST PASSIVE_VOICE FORM+1: only the
+                    stages producing them (and their dependencies) are built''')
+    parser.add_argument('-frozen', action='store_true', help='''encodes features with lexicons frozen on wTreino,
+                    unseen tokens share an unknown id (default: lexicons of every dataset)''')
 
 
     args = parser.parse_args()
-    if not (args.context or args.dtree or args.window):
+    if args.load:
+        warnings.warn('-load is deprecated, cached features are reused unless -refresh is given',
+                      DeprecationWarning)
+    del args.load
+    if not (args.context or args.dtree or args.window or args.features):
         args.window = True
+    if args.cost is None:
+        args.cost = CGRID if args.search else [C]
     svm_srl(**args.__dict__)
\ No newline at end of file
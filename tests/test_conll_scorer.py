@@ -0,0 +1,145 @@
+'''
+    @author: Varela
+
+    ConllScorer's counts and report against srlconll-1.1/bin/srl-eval.pl
+'''
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from models.conll_scorer import ConllScorer, report
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+SRLCONLL_DIR = os.path.join(ROOT_DIR, 'srlconll-1.1')
+PROPS_DIR = os.path.join(ROOT_DIR, 'datasets_1.1', 'props')
+
+# two sentences: predicates dar and ir sharing the first one, ser in the second
+# with a discontinuous A1 (C-A1) and a reference argument (R-A0)
+GOLD = '''\
+-    (A0*     (A0*
+-    *)       *)
+dar  (V*)     (A1*)
+-    (A1*     *
+ir   *)       (V*)
+-    (C-A1*)  (AM-TMP*)
+
+-    (A0*)
+-    (R-A0*)
+ser  (V*)
+-    (A1*
+-    *)
+
+'''
+
+PREDICTIONS = {
+    'gold': GOLD,
+    # wrong role, dropped continuation, AM-LOC instead of AM-TMP, shorter A1
+    'labels': '''\
+-    (A2*     (A0*
+-    *)       *)
+dar  (V*)     (A1*)
+-    (A1*     *
+ir   *)       (V*)
+-    *        (AM-LOC*)
+
+-    (A0*)
+-    *
+ser  (V*)
+-    (A1*)
+-    *
+
+''',
+    # ir is not predicted, ser becomes estar
+    'props': '''\
+-    (A0*
+-    *)
+dar  (V*)
+-    (A1*
+-    *)
+-    *
+
+-    (A0*)
+-    (A1*)
+estar (V*)
+-    *
+-    *
+
+''',
+}
+
+# srl-eval.pl's figures for PREDICTIONS: sentences, propositions, perfect
+# and overall ok, op, ms
+EXPECTED = {
+    'gold': (2, 3, 3, (8, 0, 0)),
+    'labels': (2, 3, 0, (3, 4, 5)),
+}
+
+
+def _score(tmp_path, gold, pred):
+    gold_path, pred_path = str(tmp_path / 'gold.props'), str(tmp_path / 'pred.props')
+    for path, text in ((gold_path, gold), (pred_path, pred)):
+        with open(path, mode='w', encoding='utf-8') as f:
+            f.write(text)
+    scorer = ConllScorer(gold_path, cache_dir=str(tmp_path) + '/')
+    return gold_path, pred_path, scorer.score_file(pred_path)
+
+
+def _perl(gold_path, pred_path):
+    '''
+        srl-eval.pl's report and warnings
+    '''
+    if shutil.which('perl') is None:
+        pytest.skip('perl is not available')
+    env = dict(os.environ)
+    lib = os.path.join(SRLCONLL_DIR, 'lib')
+    env['PERL5LIB'] = lib + os.pathsep + env['PERL5LIB'] if 'PERL5LIB' in env else lib
+    pipe = subprocess.run(['perl', os.path.join(SRLCONLL_DIR, 'bin', 'srl-eval.pl'),
+                           gold_path, pred_path],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    if pipe.returncode != 0:
+        pytest.skip('srl-eval.pl does not run: {:}'.format(pipe.stderr.decode('utf-8')[:200]))
+    warnings = re.findall(r'^WARNING : (.*)$', pipe.stderr.decode('utf-8'), flags=re.M)
+    return pipe.stdout.decode('utf-8'), warnings
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_counts(tmp_path, name):
+    _, _, counts = _score(tmp_path, GOLD, PREDICTIONS[name])
+    sentences, propositions, perfect, overall = EXPECTED[name]
+
+    assert (counts['sentences'], counts['propositions'], counts['perfect']) == \
+        (sentences, propositions, perfect)
+    assert tuple(counts['overall'][k] for k in ('ok', 'op', 'ms')) == overall
+
+
+@pytest.mark.parametrize('name', sorted(PREDICTIONS))
+def test_report_matches_srl_eval(tmp_path, name):
+    gold_path, pred_path, counts = _score(tmp_path, GOLD, PREDICTIONS[name])
+    txt, warnings = _perl(gold_path, pred_path)
+
+    assert report(counts) == txt
+    assert counts['warnings'] == warnings
+
+
+@pytest.mark.parametrize('dataset', ['wValidacao', 'Teste'])
+def test_report_matches_srl_eval_on_datasets(tmp_path, dataset):
+    path = os.path.join(PROPS_DIR, '{:}.golden.props'.format(dataset))
+    if not os.path.isfile(path):
+        pytest.skip('{:} is not available'.format(path))
+    with open(path, mode='r', encoding='utf-8') as f:
+        gold = f.read()
+    # relabels every third argument of the first column of tags
+    lines = gold.split('\n')
+    for i, line in enumerate(lines):
+        values = line.split()
+        if len(values) > 1 and i % 3 == 0:
+            values[1] = values[1].replace('A1', 'A2').replace('A0', 'A1')
+            lines[i] = '\t'.join(values)
+    gold_path, pred_path, counts = _score(tmp_path, gold, '\n'.join(lines))
+    txt, warnings = _perl(gold_path, pred_path)
+
+    assert report(counts) == txt
+    assert counts['warnings'] == warnings
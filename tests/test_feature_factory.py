@@ -0,0 +1,84 @@
+'''
+    @author: Varela
+
+    Columns consumed for the selected feature sets and features, and the
+    sharded build against the whole build
+'''
+import numpy as np
+import pytest
+
+import models.feature_factory as feature_factory
+from models.feature_factory import PIPELINE, SHIFTER_SHIFTS, consumed_columns
+from models.propositions import PropositionIndex
+from models.token_table import TokenTable
+
+CONLL_COLUMNS = ('ID', 'FORM', 'LEMMA', 'GPOS', 'MORF', 'DTREE', 'FUNC', 'CTREE', 'PRED', 'HEAD')
+
+
+def _db(size=12):
+    '''
+        conll columns plus the FORM window and PRED_DIST as process leaves them
+    '''
+    rng = np.random.RandomState(0)
+    db = TokenTable(size)
+    db.set_array('P', np.repeat(np.arange(size // 3), 3))
+    for column in CONLL_COLUMNS:
+        tokens = ['{:}_{:}'.format(column, i) for i in range(3)]
+        db.lexicons[column] = dict(zip(tokens, range(len(tokens))))
+        db.set_codes(column, rng.randint(len(tokens), size=size), column)
+    for shift in SHIFTER_SHIFTS:
+        db.set_codes('FORM{:+d}'.format(shift), rng.randint(3, size=size), 'FORM')
+    db.set_array('PRED_DIST', rng.randint(-3, 4, size=size))
+    return db
+
+
+def test_features_add_only_the_requested_columns():
+    db = _db()
+    base = consumed_columns(db, windows=False)
+    assert base == ['P'] + list(CONLL_COLUMNS)
+
+    columns = consumed_columns(db, windows=False, features=['FORM+1'])
+    assert [column for column in columns if column not in base] == ['FORM+1']
+
+
+def test_windows_keep_every_shift():
+    db = _db()
+    columns = consumed_columns(db, windows=True, features=['FORM+1'])
+    assert [column for column in columns if column not in CONLL_COLUMNS + ('P',)] == \
+        ['FORM{:+d}'.format(shift) for shift in SHIFTER_SHIFTS]
+
+
+def test_to_svm_encodes_one_extra_column():
+    try:
+        from models.svm import to_svm
+    except Exception:
+        # liblinear.py raises a bare Exception when liblinear.so.3 does not load
+        pytest.skip('liblinear shared library is not available')
+    db = _db()
+    base = to_svm(db, db.lexicons, CONLL_COLUMNS, consumed_columns(db, windows=False))
+    extra = to_svm(db, db.lexicons, CONLL_COLUMNS,
+                   consumed_columns(db, windows=False, features=['FORM+1']))
+
+    assert [column for column in extra[3] if column not in base[3]] == ['FORM+1']
+    assert extra[0].shape[1] == base[0].shape[1] + len(db.lexicons['FORM'])
+
+
+@pytest.mark.parametrize('family', ['column_shifter', 'column_shifts_ctx_p'])
+def test_shards_merge_to_the_whole_build(family):
+    db = _db()
+    db.propositions = PropositionIndex.build(db)
+    stage, = [stage for stage in PIPELINE if stage.family == family]
+    whole = stage.compute(db.select(stage.requires))
+
+    feature_factory._build.update(db=db, plan=[(stage, None)])
+    try:
+        shards = feature_factory._shards(db, 3)
+        parts = [feature_factory._build_unit(0, lb, ub) for lb, ub in shards]
+    finally:
+        feature_factory._build.clear()
+    merged = feature_factory._merge(db, parts)
+
+    assert len(shards) == 3
+    assert merged.keys() == whole.keys()
+    for column in whole.keys():
+        np.testing.assert_array_equal(merged.codes(column), whole.codes(column))
@@ -0,0 +1,62 @@
+'''
+    @author: Varela
+
+    predict_batch against liblinear's per instance predict
+'''
+import numpy as np
+import pytest
+from scipy import sparse
+
+try:
+    from models.lib import liblinearutil as util
+except Exception:
+    # liblinear.py raises a bare Exception when liblinear.so.3 does not load
+    pytest.skip('liblinear shared library is not available', allow_module_level=True)
+
+# (solver, number of classes), 11 is L2R_L2LOSS_SVR
+CASES = [(0, 3), (1, 3), (1, 2), (util.MCSVM_CS, 3), (util.MCSVM_CS, 2), (11, 2)]
+
+
+def _problem(n_features, n_classes, n=60, seed=0):
+    rng = np.random.RandomState(seed)
+    x = sparse.random(n, n_features, density=0.4, format='csr', random_state=rng)
+    y = rng.randint(n_classes, size=n).astype(np.float64)
+    return x, y
+
+
+def _predict(x, m):
+    labels, _, values = util.predict([], x, m, '-q')
+    return np.array(labels), np.array(values)
+
+
+@pytest.mark.parametrize('solver,n_classes', CASES)
+@pytest.mark.parametrize('bias', [-1, 1])
+def test_predict_batch_matches_predict(solver, n_classes, bias):
+    x, y = _problem(8, n_classes)
+    m = util.train(y, x, '-q -s {:} -B {:}'.format(solver, bias))
+
+    labels, values = util.predict_batch(x, m)
+    expected_labels, expected_values = _predict(x, m)
+    np.testing.assert_array_equal(labels, expected_labels)
+    # predict keeps a single decision value for any two class model, MCSVM_CS included
+    np.testing.assert_allclose(values[:, :expected_values.shape[1]], expected_values,
+                               rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('bias', [-1, 1])
+def test_predict_batch_ignores_columns_past_the_model(bias):
+    x, y = _problem(8, 3)
+    m = util.train(y, x, '-q -s 1 -B {:}'.format(bias))
+
+    # column 8 is feature index 9 which liblinear reads as the bias feature
+    wider = sparse.hstack([x, sparse.csr_matrix(np.full((x.shape[0], 3), 5.0))]).tocsr()
+    labels, values = util.predict_batch(wider, m)
+    expected_labels, expected_values = _predict(x, m)
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_allclose(values, expected_values, rtol=1e-12, atol=1e-12)
+
+    fallback_labels = np.empty(x.shape[0])
+    fallback_values = np.empty_like(values)
+    util._predict_batch_values(x, m, fallback_labels, fallback_values)
+    np.testing.assert_array_equal(fallback_labels, expected_labels)
+    np.testing.assert_allclose(fallback_values, expected_values, rtol=1e-12, atol=1e-12)